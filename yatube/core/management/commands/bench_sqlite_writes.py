@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from core.management.helpers import close_connections
+from core.sqlite import is_lock_error, retry_on_lock
+from posts.models import Post, UserCounter
+
+ALIAS = 'bench_sqlite'
+
+User = get_user_model()
+
+
+def write_post(author_id):
+    """Транзакция как у post_create: пост и счётчик автора."""
+    with transaction.atomic(using=ALIAS):
+        Post.objects.using(ALIAS).bulk_create(
+            [Post(text='Пост для замера', author_id=author_id)]
+        )
+        UserCounter.objects.using(ALIAS).filter(user_id=author_id).update(
+            posts_count=F('posts_count') + 1
+        )
+
+
+def run_writer(task):
+    author_id, duration, retry = task
+    write = retry_on_lock(write_post, using=ALIAS) if retry else write_post
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            write(author_id)
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+def run_reader(task):
+    """Длинные чтения, которые без WAL не дают писателю закоммитить."""
+    _, duration, _ = task
+    reads = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            list(Post.objects.using(ALIAS).values_list('text')[:5000])
+            reads += 1
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+    return reads
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет запись в SQLite под N параллельными писателями: '
+        'без настроек core.sqlite и с ними (PRAGMA и повторы)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=5, help='Секунд на замер'
+        )
+        parser.add_argument(
+            '--mode', choices=('plain', 'tuned', 'both'), default='both'
+        )
+
+    def handle(self, *args, **options):
+        modes = (
+            ('plain', 'tuned') if options['mode'] == 'both'
+            else (options['mode'],)
+        )
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                self.prepare(os.path.join(directory, 'bench.sqlite3'), mode)
+                self.report(mode, *self.measure(options, mode == 'tuned'))
+                connections[ALIAS].close()
+                # Следующий режим создаст соединение с другими настройками.
+                del connections[ALIAS]
+
+    def prepare(self, path, mode):
+        connections.databases[ALIAS] = {
+            **connections.databases['default'],
+            'NAME': path,
+            'CONN_MAX_AGE': 0,
+            'PRAGMAS': settings.SQLITE_PRAGMAS if mode == 'tuned' else {},
+        }
+        call_command('migrate', database=ALIAS, verbosity=0)
+        for number in range(4):
+            author = User.objects.db_manager(ALIAS).create_user(
+                username=f'bench{number}'
+            )
+            UserCounter.objects.using(ALIAS).create(user=author)
+
+    def measure(self, options, retry):
+        author_ids = list(
+            User.objects.using(ALIAS).values_list('pk', flat=True)
+        )
+        duration = options['duration']
+        writers = [
+            (author_ids[number % len(author_ids)], duration, retry)
+            for number in range(options['writers'])
+        ]
+        readers = [(None, duration, retry)] * options['readers']
+        close_connections()
+        with ProcessPoolExecutor(
+            len(writers) + len(readers),
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=close_connections
+        ) as executor:
+            started = time.perf_counter()
+            writing = [executor.submit(run_writer, task) for task in writers]
+            reading = [executor.submit(run_reader, task) for task in readers]
+            written = [future.result() for future in writing]
+            read = sum(future.result() for future in reading)
+            elapsed = time.perf_counter() - started
+        return written, read, elapsed
+
+    def report(self, mode, written, read, elapsed):
+        latencies = sorted(
+            latency for result, _ in written for latency in result
+        )
+        errors = sum(errors for _, errors in written)
+        attempts = len(latencies) + errors
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        median = statistics.median(latencies) if latencies else 0
+        self.stdout.write(
+            f'{mode}: {len(latencies) / elapsed:.0f} записей/с, '
+            f'ошибок {errors} ({errors / max(attempts, 1):.1%}), '
+            f'чтений {read}, задержка p50 {median * 1000:.1f} мс, '
+            f'p95 {p95 * 1000:.1f} мс'
+        )
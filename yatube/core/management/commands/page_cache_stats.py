@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core import page_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Доля попаданий кеша страниц для анонимных читателей. Счётчики '
+        'общие для процессов сайта, только если общий кеш'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики'
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        self.stdout.write(
+            f'Обращений {stats["lookups"]}, попаданий {stats["hits"]}, '
+            f'промахов {stats["misses"]}, доля попаданий '
+            f'{stats["hit_ratio"]:.1%}; мимо кеша {stats["bypasses"]}'
+        )
+        if options['reset']:
+            page_cache.reset_stats()
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def copy_database(source, target):
+    """Согласованная копия SQLite-базы через backup API.
+
+    Читатели копии не видят её наполовину записанной: страницы
+    переносятся в одной транзакции.
+    """
+    with sqlite3.connect(source) as source_db, \
+            sqlite3.connect(target) as target_db:
+        source_db.backup(target_db)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заменитель репликации для локальной проверки: копирует SQLite-базу '
+        'default во все базы из REPLICA_DATABASES'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять раз в столько секунд; 0 - скопировать один раз'
+        )
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        if not settings.REPLICA_DATABASES:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_SQLITE_REPLICA'
+            )
+        for alias in ['default', *settings.REPLICA_DATABASES]:
+            if databases[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(
+                    f'{alias}: команда работает только с SQLite'
+                )
+        source = databases['default']['NAME']
+        while True:
+            started = time.perf_counter()
+            for alias in settings.REPLICA_DATABASES:
+                copy_database(source, databases[alias]['NAME'])
+            self.stdout.write(
+                f'Скопировано за {time.perf_counter() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
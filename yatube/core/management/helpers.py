@@ -0,0 +1,17 @@
+from django.db import connections
+
+
+class Rollback(Exception):
+    """Выбрасывается в конце transaction.atomic() замера.
+
+    Всё, что создал замер, откатывается вместе с транзакцией.
+    """
+
+
+def close_connections():
+    """Закрывает соединения с базой перед запуском пула процессов.
+
+    Соединения родителя нельзя делить между процессами: функция же
+    служит initializer для ProcessPoolExecutor.
+    """
+    connections.close_all()
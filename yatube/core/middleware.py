@@ -0,0 +1,114 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import get_conditional_response
+
+from . import page_cache
+from .queries import get_query_budget, record_queries
+
+logger = logging.getLogger('core.queries')
+
+page_cache_logger = logging.getLogger('core.page_cache')
+
+
+class QueryInspectorMiddleware:
+    """Считает SQL-запросы каждого view и предупреждает о N+1.
+
+    Включается настройкой QUERY_INSPECTOR_ENABLED. Пишет в лог
+    'core.queries', если view превысил свой query_budget или повторил
+    один и тот же по форме запрос QUERY_INSPECTOR_REPEAT_THRESHOLD раз.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as log:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = get_query_budget(match.func)
+        if budget is not None and len(log) > budget:
+            logger.warning(
+                '%s: %d SQL-запросов при бюджете %d',
+                match.view_name, len(log), budget
+            )
+        repeated = log.repeated(settings.QUERY_INSPECTOR_REPEAT_THRESHOLD)
+        for shape, count in repeated.items():
+            logger.warning(
+                '%s: возможный N+1, %d одинаковых запросов: %s',
+                match.view_name, count, shape
+            )
+        return response
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным читателям готовые страницы из кеша.
+
+    Кешируются GET-ответы view с cache_anonymous, ключ - путь с query
+    string. Запросы с cookie сессии или из PAGE_CACHE_BYPASS_COOKIES
+    идут мимо кеша. Страницы сбрасываются по путям через
+    page_cache.purge_paths, поэтому живут долго. Каждые
+    PAGE_CACHE_REPORT_EVERY обращений доля попаданий пишется в лог
+    'core.page_cache'. Включается настройкой PAGE_CACHE_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.bypass_cookies = {
+            settings.SESSION_COOKIE_NAME,
+            *settings.PAGE_CACHE_BYPASS_COOKIES,
+        }
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if key is not None and self.is_storable(request, response):
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not page_cache.is_cacheable(view_func):
+            return None
+        if self.bypass_cookies & request.COOKIES.keys():
+            page_cache.record('bypasses')
+            return None
+        key = page_cache.page_key(request)
+        response = cache.get(key)
+        lookups = page_cache.record('lookups')
+        if lookups % settings.PAGE_CACHE_REPORT_EVERY == 0:
+            self.report()
+        if response is None:
+            page_cache.record('misses')
+            request._page_cache_key = key
+            return None
+        return get_conditional_response(
+            request, etag=response.get('ETag'), response=response
+        )
+
+    def report(self):
+        stats = page_cache.stats()
+        page_cache_logger.info(
+            'Кеш страниц: %d обращений, доля попаданий %.1f%%, '
+            'обходов %d',
+            stats['lookups'], stats['hit_ratio'] * 100, stats['bypasses']
+        )
+
+    def is_storable(self, request, response):
+        # Ответ, который ставит cookie или закрыт для кешей, личный.
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
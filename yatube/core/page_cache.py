@@ -0,0 +1,88 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.encoding import iri_to_uri
+
+from . import versions
+
+# Версия всех страниц: сдвигается, когда меняется то, что выводится
+# везде (например, название группы).
+ALL_PAGES = '*'
+
+STATS_KEYS = {
+    'lookups': 'page_cache:lookups',
+    'misses': 'page_cache:misses',
+    'bypasses': 'page_cache:bypasses',
+}
+
+
+def cache_anonymous(view_func):
+    """Разрешает кешировать ответ view целиком для анонимных читателей."""
+    view_func.cache_anonymous = True
+    return view_func
+
+
+def is_cacheable(view_func):
+    return getattr(view_func, 'cache_anonymous', False)
+
+
+def _version_key(path):
+    return f'page_cache:version:{path}'
+
+
+def page_key(request):
+    """Ключ ответа: путь с query string и версии пути и всех страниц.
+
+    Все варианты query string одного пути сбрасываются вместе. Путь
+    кодируется как в reverse(), которым пути передаются в purge_paths.
+    """
+    all_pages, path = versions.get_versions([
+        _version_key(ALL_PAGES), _version_key(iri_to_uri(request.path))
+    ])
+    full_path = hashlib.md5(
+        request.get_full_path().encode('utf-8')
+    ).hexdigest()
+    return f'page_cache:{all_pages}:{path}:{full_path}'
+
+
+def purge_paths(paths):
+    """Сбрасывает закешированные страницы путей со всеми query string.
+
+    Как и версии лент, версии сдвигаются сразу и ещё раз после коммита.
+    """
+    versions.bump_versions(_version_key(path) for path in paths)
+
+
+def purge_all():
+    purge_paths([ALL_PAGES])
+
+
+def record(outcome):
+    """Увеличивает счётчик и возвращает новое значение."""
+    key = STATS_KEYS[outcome]
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+        return 1
+
+
+def stats():
+    """Обращения к кешу, попадания, промахи, обходы и доля попаданий.
+
+    Счётчики лежат в кеше: при общем кеше (memcached, Redis) это
+    статистика всех процессов сайта, при LocMemCache - только своего.
+    """
+    values = cache.get_many(STATS_KEYS.values())
+    result = {
+        name: values.get(key, 0) for name, key in STATS_KEYS.items()
+    }
+    result['hits'] = max(result['lookups'] - result['misses'], 0)
+    result['hit_ratio'] = (
+        result['hits'] / result['lookups'] if result['lookups'] else 0.0
+    )
+    return result
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
@@ -0,0 +1,57 @@
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+IN_LIST_RE = re.compile(r'\((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+def query_shape(sql):
+    """Форма запроса: SQL без значений, списков IN и чисел."""
+    return NUMBER_RE.sub('N', IN_LIST_RE.sub('(...)', sql))
+
+
+class QueryLog:
+    """Журнал выполненных SQL-запросов."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold):
+        """Формы запросов, выполненные не меньше threshold раз (N+1)."""
+        shapes = Counter(query_shape(sql) for sql in self.queries)
+        return {
+            shape: count for shape, count in shapes.items()
+            if count >= threshold
+        }
+
+
+@contextmanager
+def record_queries():
+    """Записывает все запросы ко всем базам внутри блока with."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def query_budget(limit):
+    """Объявляет для view допустимое число SQL-запросов на запрос."""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    return getattr(view_func, 'query_budget', None)
@@ -0,0 +1,77 @@
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+class ReplicaRouter:
+    """Отправляет чтения view из replica_reads на реплики.
+
+    Всё остальное - записи, чтения других view, команды и миграции -
+    идёт в default. После первой записи в запросе чтения тоже
+    возвращаются в default, чтобы не прочитать отставшую копию.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if replicas and _replica_reads.get() and not _wrote.get():
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема на реплики приходит вместе с данными.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def replica_reads(view_func):
+    """Чтения view идут на реплику, если читатель недавно не писал."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if PIN_COOKIE in request.COOKIES:
+            return view_func(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    """Закрепляет за написавшим читателем основную базу.
+
+    Если запрос что-то записал, ответ ставит cookie на
+    REPLICA_PIN_SECONDS: пока реплика догоняет, читатель видит свой
+    новый пост или комментарий.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _wrote.reset(token)
+        if settings.REPLICA_DATABASES and (
+            wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')
+        ):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
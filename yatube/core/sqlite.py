@@ -0,0 +1,87 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite.
+
+    WAL разводит читателей и писателя, busy_timeout заставляет ждать
+    блокировку вместо немедленной ошибки «database is locked».
+    Набор PRAGMA для отдельной базы можно задать ключом PRAGMAS в её
+    настройках в DATABASES.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', settings.SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_lock(func=None, using=None):
+    """Повторяет транзакцию, если SQLite не дал взять блокировку записи.
+
+    Паузы растут экспоненциально со случайным разбросом (full jitter),
+    чтобы повторные попытки писателей не сталкивались снова. Внутри
+    чужой транзакции повтор бессмыслен, там ошибка пробрасывается сразу.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            attempts = settings.SQLITE_WRITE_RETRIES
+            for attempt in range(attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as error:
+                    in_transaction = transaction.get_connection(
+                        using
+                    ).in_atomic_block
+                    if (
+                        attempt == attempts or in_transaction
+                        or not is_lock_error(error)
+                    ):
+                        raise
+                    delay = random.uniform(
+                        0, settings.SQLITE_RETRY_BASE_DELAY * 2 ** attempt
+                    )
+                    logger.info(
+                        'База занята, попытка %d через %.3f с',
+                        attempt + 2, delay
+                    )
+                    time.sleep(delay)
+        return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def bulk_create_ids(model, objects):
+    """bulk_create, который возвращает id новых строк и ставит их объектам.
+
+    SQLite не возвращает id из bulk_create: новые строки - это id больше
+    прежнего максимума, по порядку вставки. Запись и чтение идут в одной
+    транзакции, команды массовой загрузки - единственный писатель.
+    """
+    with transaction.atomic():
+        last_id = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        model.objects.bulk_create(objects)
+        ids = list(model.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+    for obj, pk in zip(objects, ids):
+        obj.pk = pk
+    return ids
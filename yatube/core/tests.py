@@ -0,0 +1,257 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, router
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+from . import page_cache
+from .management.commands.replicate_sqlite import copy_database
+from .queries import query_shape, record_queries
+from .routers import PIN_COOKIE, PrimaryPinMiddleware, replica_reads
+from .sqlite import retry_on_lock
+
+
+class QueryShapeTests(TestCase):
+    def test_shape_ignores_values_and_in_lists(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            query_shape('SELECT * FROM t WHERE id IN (%s) LIMIT 10'),
+        )
+
+
+@override_settings(QUERY_INSPECTOR_ENABLED=True)
+class QueryInspectorMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_queries_are_logged(self):
+        with self.settings(QUERY_INSPECTOR_REPEAT_THRESHOLD=1):
+            with self.assertLogs('core.queries', 'WARNING') as logs:
+                Client().get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+    def test_record_queries_counts_all_queries(self):
+        with record_queries() as log:
+            Client().get(reverse('posts:index'))
+        self.assertGreater(len(log), 0)
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TestCase):
+    """Чтения лент идут на реплику, кроме только что писавших"""
+
+    def setUp(self):
+        self.seen = []
+
+        @replica_reads
+        def read_view(request):
+            self.seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        def write_view(request):
+            router.db_for_write(Post)
+            self.seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        self.read_view = PrimaryPinMiddleware(read_view)
+        self.write_view = PrimaryPinMiddleware(write_view)
+        self.factory = RequestFactory()
+
+    def test_read_view_uses_replica(self):
+        response = self.read_view(self.factory.get('/'))
+        self.assertEqual(self.seen, ['replica'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_code_uses_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_writer_pinned_to_primary(self):
+        response = self.write_view(self.factory.get('/'))
+        self.assertEqual(self.seen, ['default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.read_view(request)
+        self.assertEqual(self.seen, ['default', 'default'])
+
+    def test_post_pins_reader(self):
+        user = get_user_model().objects.create_user(username='Автор')
+        client = Client()
+        client.force_login(user)
+        response = client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ReplicateSqliteTests(TestCase):
+    def test_copy_database(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'source.sqlite3')
+        target = os.path.join(directory, 'target.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE t (value TEXT)')
+            db.execute("INSERT INTO t VALUES ('копия')")
+        copy_database(source, target)
+        with sqlite3.connect(target) as db:
+            self.assertEqual(
+                db.execute('SELECT value FROM t').fetchall(), [('копия',)]
+            )
+
+
+class SqlitePragmaTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_RETRY_BASE_DELAY=0)
+class RetryOnLockTests(SimpleTestCase):
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'ok'
+        return write, calls
+
+    def test_retries_until_success(self):
+        write, calls = self.flaky(2)
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_retries(self):
+        write, calls = self.flaky(3)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        write, calls = self.flaky(1, 'no such table: posts_post')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTests(TestCase):
+    """Анонимные страницы берутся из кеша и сбрасываются по путям"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create_user(username='Автор')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts', args=['group']),
+            'other': reverse('posts:group_posts', args=['other']),
+            'profile': reverse('posts:profile', args=['Автор']),
+            'post': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def is_cached(self, url):
+        # Ответ из кеша не рендерит шаблон, у него нет контекста.
+        return Client().get(url).context is None
+
+    def warm(self):
+        for url in self.urls.values():
+            Client().get(url)
+
+    def test_second_anonymous_request_is_hit(self):
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                first = Client().get(url)
+                self.assertIsNotNone(first.context)
+                second = Client().get(url)
+                self.assertIsNone(second.context)
+                self.assertEqual(second.content, first.content)
+        stats = page_cache.stats()
+        self.assertEqual(stats['lookups'], 10)
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_query_string_is_part_of_key(self):
+        Client().get(self.urls['index'])
+        self.assertFalse(self.is_cached(self.urls['index'] + '?page=2'))
+
+    def test_session_cookie_bypasses_cache(self):
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.urls['index'])
+        self.assertIsNotNone(client.get(self.urls['index']).context)
+        self.assertEqual(page_cache.stats()['bypasses'], 2)
+
+    def test_cached_page_answers_not_modified(self):
+        etag = Client().get(self.urls['index'])['ETag']
+        response = Client().get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_post_purges_its_pages_only(self):
+        self.warm()
+        Post.objects.create(text='Новый', author=self.author, group=self.group)
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                self.assertFalse(self.is_cached(self.urls[name]))
+        self.assertTrue(self.is_cached(self.urls['other']))
+        self.assertTrue(self.is_cached(self.urls['post']))
+
+    def test_moving_post_purges_old_group(self):
+        self.warm()
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertFalse(self.is_cached(self.urls['group']))
+        self.assertFalse(self.is_cached(self.urls['other']))
+        self.assertFalse(self.is_cached(self.urls['post']))
+
+    def test_comment_purges_post_page(self):
+        self.warm()
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertFalse(self.is_cached(self.urls['post']))
+        self.assertTrue(self.is_cached(self.urls['index']))
+
+    def test_group_change_purges_all_pages(self):
+        self.warm()
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                self.assertFalse(self.is_cached(url))
+
+    def test_stats_command(self):
+        Client().get(self.urls['index'])
+        Client().get(self.urls['index'])
+        out = StringIO()
+        call_command('page_cache_stats', '--reset', stdout=out)
+        self.assertIn('50.0%', out.getvalue())
+        self.assertEqual(page_cache.stats()['lookups'], 0)
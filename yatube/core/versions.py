@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def initial_version():
+    """Стартовая версия растёт со временем.
+
+    Если ключ версии вытеснили из кеша, новая версия не совпадёт со
+    старой, и старые записи не будут отданы повторно.
+    """
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """Версии по ключам кеша; недостающие создаются заново.
+
+    Срок жизни версий - CACHE_VERSION_TTL: без общего кеша версии
+    истекают, и процессы не отдают записи, сброшенные в другом процессе.
+    """
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    missing = {
+        key: initial_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, settings.CACHE_VERSION_TTL)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def incr_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_version(), settings.CACHE_VERSION_TTL)
+
+
+def bump_versions(keys):
+    """Увеличивает версии сразу и ещё раз после коммита транзакции.
+
+    Запись, собранная другим запросом до коммита, не переживёт второй
+    сдвиг.
+    """
+    keys = list(keys)
+    incr_versions(keys)
+    transaction.on_commit(lambda: incr_versions(keys))
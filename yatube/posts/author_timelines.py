@@ -0,0 +1,79 @@
+import heapq
+import itertools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Post
+
+
+def author_timeline_key(author_id):
+    return f'feed:author:{author_id}'
+
+
+def load_author_timeline(author_id):
+    """Последние посты автора как список (pub_date, id) по убыванию."""
+    return list(
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pub_date', 'pk')[:settings.FEED_AUTHOR_CACHE_SIZE]
+    )
+
+
+def refresh_author_timeline(author_id):
+    cache.set(
+        author_timeline_key(author_id),
+        load_author_timeline(author_id),
+        settings.FEED_AUTHOR_CACHE_TTL
+    )
+
+
+def get_author_timelines(author_ids):
+    """Списки последних постов авторов: одно чтение из кеша на всех.
+
+    Отсутствующие в кеше списки загружаются из базы и кладутся обратно
+    одним set_many.
+    """
+    keys = {author_timeline_key(author_id): author_id
+            for author_id in author_ids}
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, author_id in keys.items():
+        if key not in cached:
+            missing[key] = load_author_timeline(author_id)
+    if missing:
+        cache.set_many(missing, settings.FEED_AUTHOR_CACHE_TTL)
+        cached.update(missing)
+    return list(cached.values())
+
+
+def normalize_cursor(cursor):
+    """Приводит курсор к виду элементов списков: (aware datetime, int).
+
+    В кеше лежат даты с поясом: наивная дата делает сравнение при
+    слиянии невозможным, такой курсор считается датой в текущем поясе.
+    """
+    pub_date, pk = cursor
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date, int(pk)
+
+
+def merge_after(timelines, cursor=None):
+    """Слияние списков по убыванию, начиная строго после курсора."""
+    merged = heapq.merge(*timelines, reverse=True)
+    if cursor is None:
+        return merged
+    cursor = normalize_cursor(cursor)
+    return itertools.dropwhile(lambda item: item >= cursor, merged)
+
+
+def merge_before(timelines, cursor):
+    """Слияние по возрастанию элементов строго новее курсора."""
+    cursor = normalize_cursor(cursor)
+    newer = (
+        reversed(list(itertools.takewhile(lambda item: item > cursor, items)))
+        for items in timelines
+    )
+    return heapq.merge(*newer)
@@ -0,0 +1,20 @@
+from django.db import transaction
+
+from core.sqlite import bulk_create_ids
+
+from .models import Post
+
+
+def bulk_create_posts(posts):
+    """bulk_create постов с датами публикации из источника.
+
+    auto_now_add перезаписывает pub_date при вставке, поэтому даты
+    возвращаются отдельным bulk_update по id новых строк.
+    """
+    pub_dates = [post.pub_date for post in posts]
+    with transaction.atomic():
+        ids = bulk_create_ids(Post, posts)
+        for post, pub_date in zip(posts, pub_dates):
+            post.pub_date = pub_date
+        Post.objects.bulk_update(posts, ['pub_date'])
+    return ids
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.urls import reverse
+
+from core import versions
+
+from .models import Follow, Group
+
+
+# Версия для изменений групп: название группы выводится во всех лентах.
+GROUPS_SCOPE = 'groups'
+
+
+def version_key(scope):
+    return f'feed_version:{scope}'
+
+
+def get_versions(scopes):
+    return versions.get_versions(version_key(scope) for scope in scopes)
+
+
+def bump_versions(scopes):
+    """Увеличивает версии лент, старые фрагменты становятся недоступны."""
+    versions.bump_versions(version_key(scope) for scope in scopes)
+
+
+def post_scopes(post, group_ids=()):
+    """Ленты, в которых показывается пост."""
+    scopes = ['index', f'author:{post.author_id}']
+    scopes += [
+        f'group:{group_id}' for group_id in {post.group_id, *group_ids}
+        if group_id is not None
+    ]
+    return scopes
+
+
+def post_pages(post, group_ids=()):
+    """Пути страниц, которые показывают пост, для кеша страниц."""
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:profile', args=[post.author.username]),
+        reverse('posts:post_detail', args=[post.pk]),
+    ]
+    group_ids = {post.group_id, *group_ids} - {None}
+    if group_ids:
+        paths += [
+            reverse('posts:group_posts', args=[slug])
+            for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        ]
+    return paths
+
+
+def bump_post_feeds(post, group_ids=()):
+    bump_versions(post_scopes(post, group_ids))
+
+
+def follow_scopes(user):
+    """Версии ленты подписок пользователя.
+
+    В ключ входят версии всех авторов, на которых он подписан: пост
+    сдвигает одну версию автора, а не версии всех его подписчиков.
+    Версия follow:<id> сдвигается при подписке и отписке.
+    """
+    return [f'follow:{user.pk}'] + [
+        f'author:{author_id}' for author_id in Follow.objects.filter(
+            user=user
+        ).order_by('author_id').values_list('author_id', flat=True)
+    ]
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def bump_group_feeds(group):
+    bump_versions([GROUPS_SCOPE, f'group:{group.pk}'])
+
+
+def feed_cache_context(request, scopes):
+    """Ключ и время жизни фрагмента ленты для тега {% cache %}.
+
+    Карточки постов внутри фрагмента кешируются отдельно по id и
+    Post.updated и переиспользуются всеми лентами.
+    """
+    scopes = [*scopes, GROUPS_SCOPE]
+    versions = ','.join(
+        f'{scope}={version}'
+        for scope, version in zip(scopes, get_versions(scopes))
+    )
+    return {
+        'feed_cache_key': f'{versions}:{request.get_full_path()}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'post_card_timeout': settings.POST_CARD_CACHE_TIMEOUT,
+    }
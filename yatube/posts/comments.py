@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import comments_scope, get_versions
+from .models import Comment
+from .paginators import comment_page
+
+
+def comments_page(post_id, after=None):
+    """Страница комментариев поста вместе с авторами.
+
+    Первая страница кешируется под версией комментариев поста: сигналы
+    сдвигают её при добавлении и удалении комментария.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    if after is not None:
+        return comment_page(comments, after)
+    version, = get_versions([comments_scope(post_id)])
+    key = f'comments:{post_id}:{version}'
+    page = cache.get(key)
+    if page is None:
+        page = comment_page(comments)
+        cache.set(key, page, settings.COMMENTS_CACHE_TIMEOUT)
+    return page
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import media
+from .models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+def _shift(field, delta):
+    """Сдвиг счётчика без ухода в минус при рассинхронизации."""
+    return Greatest(F(field) + delta, 0)
+
+
+def _deltas(**deltas):
+    return {field: _shift(field, delta) for field, delta in deltas.items()}
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя, при необходимости создавая строку."""
+    updated = UserCounter.objects.filter(user_id=user_id).update(
+        **_deltas(**deltas)
+    )
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        UserCounter.objects.get_or_create(user_id=user_id)
+        UserCounter.objects.filter(user_id=user_id).update(
+            **_deltas(**deltas)
+        )
+
+
+def user_counters(user):
+    """Счётчики пользователя; для пользователя без строки — нули."""
+    try:
+        return user.counters
+    except UserCounter.DoesNotExist:
+        return UserCounter(user=user)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=_shift('posts_count', delta)
+        )
+
+
+def bump_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shift('comments_count', delta)
+    )
+
+
+def _count(queryset, field):
+    """Подзапрос с числом строк queryset, связанных с внешним объектом."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount():
+    """Пересчитывает все счётчики по исходным таблицам.
+
+    Возвращает число обновлённых строк по каждому счётчику.
+    """
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=user_id) for user_id in missing],
+        ignore_conflicts=True
+    )
+    return {
+        'users': UserCounter.objects.update(
+            posts_count=_count(Post.objects.all(), 'author'),
+            followers_count=_count(Follow.objects.all(), 'author'),
+            following_count=_count(Follow.objects.all(), 'user'),
+        ),
+        'groups': Group.objects.update(
+            posts_count=_count(Post.objects.all(), 'group')
+        ),
+        'posts': Post.objects.update(
+            comments_count=_count(Comment.objects.all(), 'post')
+        ),
+        'files': media.recount_references(),
+    }
@@ -0,0 +1,69 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, Max, OuterRef
+
+from .caching import GROUPS_SCOPE, get_versions
+from .models import Follow, Group, Post
+
+User = get_user_model()
+
+
+def page_etag(request, scopes, *state):
+    """ETag страницы из версий лент и мелкого состояния из базы.
+
+    Версии сдвигаются сигналами при любом изменении постов в ленте,
+    поэтому ETag меняется вместе со страницей. Адрес с номером страницы
+    и читатель входят в ETag: у каждого своя шапка и кнопки.
+    """
+    scopes = [*scopes, GROUPS_SCOPE]
+    parts = [
+        settings.PAGE_ETAG_VERSION,
+        request.user.pk,
+        request.get_full_path(),
+        *get_versions(scopes),
+        *state,
+    ]
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def index_etag(request):
+    return page_etag(request, ['index'])
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return page_etag(request, [f'group:{group_id}'])
+
+
+def profile_etag(request, username):
+    """Счётчики и подписка читателя не входят в версии ленты автора."""
+    authors = User.objects.filter(username=username)
+    fields = [
+        'pk', 'counters__posts_count', 'counters__followers_count',
+        'counters__following_count',
+    ]
+    if request.user.is_authenticated:
+        authors = authors.annotate(is_following=Exists(Follow.objects.filter(
+            user=request.user, author=OuterRef('pk')
+        )))
+        fields.append('is_following')
+    row = authors.values_list(*fields).first()
+    if row is None:
+        return None
+    return page_etag(request, [f'author:{row[0]}'], *row)
+
+
+def post_etag(request, post_id):
+    """Правка поста сдвигает версию автора, комментарии - счётчик и max id."""
+    row = Post.objects.filter(pk=post_id).order_by().values_list(
+        'author_id', 'comments_count', 'author__counters__posts_count'
+    ).annotate(last_comment=Max('comments__pk')).first()
+    if row is None:
+        return None
+    return page_etag(request, [f'author:{row[0]}'], *row)
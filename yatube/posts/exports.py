@@ -0,0 +1,117 @@
+import csv
+import json
+
+from django.conf import settings
+
+from .models import Comment, Follow, Post
+
+FIELDS = (
+    'type', 'id', 'author', 'pub_date', 'text', 'group', 'image', 'post',
+    'following',
+)
+
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def keyset_rows(queryset, fields, chunk_size=None):
+    """Строки queryset по возрастанию id, запрос на каждые chunk_size.
+
+    Внутри пачки строки читаются iterator(): ни пачка, ни вся выгрузка
+    не собираются в памяти, а курсор не живёт дольше одного запроса.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last_id = 0
+    while True:
+        rows = queryset.filter(pk__gt=last_id).order_by('pk').values_list(
+            'pk', *fields
+        )[:chunk_size]
+        count = 0
+        for row in rows.iterator(chunk_size=chunk_size):
+            count += 1
+            yield row
+        if count < chunk_size:
+            return
+        last_id = row[0]
+
+
+def export_rows(author=None, group=None, chunk_size=None):
+    """Посты, комментарии и подписки автора или группы как словари.
+
+    Строки постов совместимы с import_posts.
+    """
+    posts = Post.objects.all()
+    comments = Comment.objects.all()
+    follows = Follow.objects.none()
+    if author is not None:
+        posts = posts.filter(author=author)
+        comments = comments.filter(author=author)
+        follows = Follow.objects.filter(user=author)
+    if group is not None:
+        posts = posts.filter(group=group)
+        comments = comments.filter(post__group=group)
+    post_fields = ('author__username', 'pub_date', 'text', 'group__slug',
+                   'image')
+    for pk, username, pub_date, text, slug, image in keyset_rows(
+        posts, post_fields, chunk_size
+    ):
+        yield {
+            'type': 'post', 'id': pk, 'author': username,
+            'pub_date': pub_date.isoformat(), 'text': text,
+            'group': slug or '', 'image': image,
+        }
+    comment_fields = ('author__username', 'created', 'text', 'post_id')
+    for pk, username, created, text, post_id in keyset_rows(
+        comments, comment_fields, chunk_size
+    ):
+        yield {
+            'type': 'comment', 'id': pk, 'author': username,
+            'pub_date': created.isoformat(), 'text': text, 'post': post_id,
+        }
+    follow_fields = ('user__username', 'author__username')
+    for pk, username, following in keyset_rows(
+        follows, follow_fields, chunk_size
+    ):
+        yield {
+            'type': 'follow', 'id': pk, 'author': username,
+            'following': following,
+        }
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), FIELDS, restval='')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream(rows, data_format, buffer_size=64 * 1024):
+    """Строки выгрузки, склеенные в куски около buffer_size символов.
+
+    Первая строка уходит отдельным куском: скачивание начинается сразу,
+    а не после первых buffer_size символов.
+    """
+    lines = jsonl_lines(rows) if data_format == 'jsonl' else csv_lines(rows)
+    buffer, size, limit = [], 0, 1
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(buffer)
+            buffer, size, limit = [], 0, buffer_size
+    if buffer:
+        yield ''.join(buffer)
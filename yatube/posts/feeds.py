@@ -0,0 +1,82 @@
+import itertools
+
+from django.conf import settings
+
+from . import author_timelines, timeline
+from .models import Follow, Post
+from .paginators import KeysetPage, get_page_obj, parse_post_cursor
+
+
+def join_feed_page(request):
+    """Лента подписок через JOIN таблиц Follow и Post."""
+    post_list = Post.objects.filter(author__following__user=request.user)
+    return get_page_obj(request, post_list.select_related('author', 'group'))
+
+
+def timeline_feed_page(request):
+    """Лента подписок из заранее разложенных записей TimelineEntry."""
+    post_list, order_fields = timeline.timeline_posts(request.user)
+    return get_page_obj(
+        request,
+        post_list.select_related('author', 'group'),
+        order_fields=order_fields
+    )
+
+
+def _page_number(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+
+def merge_feed_page(request):
+    """Лента подписок слиянием закешированных лент авторов.
+
+    Списки последних постов каждого автора сливаются через heapq,
+    из базы одним in_bulk загружаются только посты текущей страницы.
+    Глубина ленты по каждому автору ограничена FEED_AUTHOR_CACHE_SIZE.
+    """
+    per_page = settings.POSTS_PER_PAGE
+    author_ids = Follow.objects.filter(
+        user=request.user
+    ).values_list('author_id', flat=True)
+    timelines = author_timelines.get_author_timelines(author_ids)
+    after = parse_post_cursor(request.GET.get('after', ''))
+    before = parse_post_cursor(request.GET.get('before', ''))
+    if before is not None:
+        items = list(itertools.islice(
+            author_timelines.merge_before(timelines, before), per_page + 1
+        ))
+        has_next, has_previous = True, len(items) > per_page
+        items = items[:per_page][::-1]
+    else:
+        merged = author_timelines.merge_after(timelines, after)
+        offset = 0
+        if after is None:
+            offset = (_page_number(request) - 1) * per_page
+        items = list(itertools.islice(
+            merged, offset, offset + per_page + 1
+        ))
+        has_next = len(items) > per_page
+        has_previous = after is not None or offset > 0
+        items = items[:per_page]
+    post_ids = [pk for _, pk in items]
+    posts = Post.objects.select_related('author', 'group').in_bulk(post_ids)
+    return KeysetPage(
+        [posts[pk] for pk in post_ids if pk in posts],
+        has_next,
+        has_previous
+    )
+
+
+FOLLOW_FEED_ENGINES = {
+    'join': join_feed_page,
+    'timeline': timeline_feed_page,
+    'merge': merge_feed_page,
+}
+
+
+def follow_feed_page(request):
+    """Страница ленты подписок движком из FOLLOW_FEED_ENGINE."""
+    return FOLLOW_FEED_ENGINES[settings.FOLLOW_FEED_ENGINE](request)
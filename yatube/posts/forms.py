@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import normalize_image, pixels_error, too_many_pixels
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,24 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        if too_many_pixels(image.image.size):
+            raise forms.ValidationError(pixels_error())
+        return normalize_image(image)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload_error = getattr(self.files.get('image'), 'upload_error', None)
+        if upload_error:
+            # Обрезанный при загрузке файл поле могло счесть битой
+            # картинкой: показываем настоящую причину.
+            self.errors.pop('image', None)
+            self.add_error('image', upload_error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import page_cache
+from posts import caching, placeholders
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит размытые заглушки для картинок постов, у которых их нет. '
+        'Работает пачками по id, можно прервать и запустить снова.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать и уже готовые заглушки'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_placeholder='')
+        started = time.perf_counter()
+        last_id, done = 0, 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            # Одна картинка может быть у нескольких постов: считаем раз.
+            for name in {name for _, name in batch}:
+                placeholder = placeholders.placeholder_for(
+                    Post(image=name).image
+                )
+                if placeholder:
+                    posts.filter(image=name).update(
+                        image_placeholder=placeholder,
+                        updated=timezone.now()
+                    )
+                    done += 1
+            # Заглушка входит в закешированные фрагменты лент и страницы.
+            caching.bump_versions([caching.GROUPS_SCOPE])
+            page_cache.purge_all()
+            self.stdout.write(
+                f'Последний id {last_id}, заглушек {done}, '
+                f'{done / (time.perf_counter() - started):.0f} картинок/с'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Готово: {done} картинок'))
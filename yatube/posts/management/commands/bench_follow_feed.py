@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from core.management.helpers import Rollback
+from posts import timeline
+from posts.feeds import FOLLOW_FEED_ENGINES
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает движки ленты подписок на синтетических данных. '
+        'Все созданные объекты откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--authors', nargs='+', type=int, default=[10, 1000, 10000],
+            help='Сколько авторов у читателя в подписках'
+        )
+        parser.add_argument(
+            '--posts-per-author', type=int, default=5,
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз запрашивать каждую страницу'
+        )
+
+    def handle(self, *args, **options):
+        for authors in options['authors']:
+            try:
+                with transaction.atomic():
+                    self.run_case(authors, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run_case(self, authors, options):
+        reader = self.create_dataset(authors, options['posts_per_author'])
+        timeline.rebuild([reader.pk])
+        factory = RequestFactory()
+        self.stdout.write(f'Авторов в подписках: {authors}')
+        for name, engine in FOLLOW_FEED_ENGINES.items():
+            cache.clear()
+            for query in ('', '?page=5'):
+                request = factory.get('/follow/' + query)
+                request.user = reader
+                started = time.perf_counter()
+                engine(request)
+                cold = time.perf_counter() - started
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    list(engine(request))
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'  {name:<9} {query or "page 1":<8} '
+                    f'холодный {cold * 1000:8.2f} мс, '
+                    f'медиана {statistics.median(timings) * 1000:8.2f} мс'
+                )
+
+    def create_dataset(self, authors, posts_per_author):
+        prefix = f'bench-{authors}-'
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}') for i in range(authors)
+        )
+        reader = User.objects.create(username=f'{prefix}reader')
+        author_ids = list(
+            User.objects.filter(username__startswith=prefix)
+            .exclude(pk=reader.pk)
+            .values_list('pk', flat=True)
+        )
+        Post.objects.bulk_create(
+            (
+                Post(author_id=author_id, text=f'Пост {i}')
+                for author_id in author_ids
+                for i in range(posts_per_author)
+            )
+        )
+        Follow.objects.bulk_create(
+            Follow(user=reader, author_id=author_id)
+            for author_id in author_ids
+        )
+        return reader
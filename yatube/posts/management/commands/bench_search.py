@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.management.helpers import Rollback
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+SYLLABLES = [
+    'ко', 'ти', 'ка', 'ро', 'ма', 'ни', 'ла', 'пе', 'су', 'до',
+    'ры', 'ве', 'зо', 'жу', 'ба', 'ле', 'ми', 'то', 'га', 'фе',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск FTS5 с icontains на синтетических постах. '
+        'Созданные посты откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=20_000,
+                            help='Размер словаря')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError(
+                'Полнотекстовый индекс работает только в SQLite'
+            )
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        vocabulary = sorted({
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+            for _ in range(options['words'])
+        })
+        # Частоты слов по закону Ципфа: есть и частые, и редкие запросы.
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        author = User.objects.create(username='bench-search-author')
+        started = time.perf_counter()
+        batch = []
+        for i in range(options['posts']):
+            words = rng.choices(vocabulary, weights, k=rng.randint(5, 40))
+            batch.append(Post(author=author, text=' '.join(words)))
+            if len(batch) == 10_000:
+                Post.objects.bulk_create(batch)
+                batch = []
+        Post.objects.bulk_create(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Создано постов: {options["posts"]} за {elapsed:.1f} с '
+            '(вместе с индексацией триггерами)'
+        )
+        queries = {
+            'частое слово': vocabulary[0],
+            'среднее слово': vocabulary[len(vocabulary) // 100],
+            'редкое слово': vocabulary[-1],
+            'два слова': f'{vocabulary[1]} {vocabulary[50]}',
+        }
+        for label, query in queries.items():
+            for name, run in (
+                ('fts5', lambda: list(search.search_page(query))),
+                ('icontains', lambda: search.icontains_page(query)),
+            ):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'{label:<14} {name:<10} '
+                    f'медиана {statistics.median(timings) * 1000:9.2f} мс'
+                )
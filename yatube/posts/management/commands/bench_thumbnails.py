@@ -0,0 +1,121 @@
+import io
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from core.management.helpers import Rollback
+from core.queries import record_queries
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+CACHE_METHODS = ('get', 'get_many', 'set', 'set_many', 'add', 'delete')
+
+
+@contextmanager
+def count_cache_calls(cache):
+    """Считает обращения к кешу KVStore, подменяя методы экземпляра.
+
+    Вложенные вызовы не считаются: LocMemCache выполняет get_many через
+    get, а сетевой кеш отвечает на get_many за один обмен.
+    """
+    calls = []
+    depth = [0]
+
+    def counting(method):
+        def wrapper(*args, **kwargs):
+            if not depth[0]:
+                calls.append(method.__name__)
+            depth[0] += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return wrapper
+
+    for name in CACHE_METHODS:
+        setattr(cache, name, counting(getattr(cache, name)))
+    try:
+        yield calls
+    finally:
+        for name in CACHE_METHODS:
+            delattr(cache, name)
+
+
+def image_file(index):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (index % 256, 0, 0)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name=f'bench-{index}.png')
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает обращения к кешу и базе при поиске миниатюр страницы: '
+        'по одной на пост и пачкой. Данные и файлы удаляются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=settings.POSTS_PER_PAGE,
+            help='Постов с картинками на странице'
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                try:
+                    with transaction.atomic():
+                        self.run(options['posts'])
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def run(self, count):
+        author = User.objects.create(username='bench-thumbnails-author')
+        for i in range(count):
+            post = Post.objects.create(
+                author=author, text=f'Пост {i}', image=image_file(i)
+            )
+            thumbnails.generate(post.image.name)
+        geometry_string, options = settings.THUMBNAIL_GEOMETRIES['card']
+        posts = list(Post.objects.filter(author=author))
+        keys = [
+            add_prefix(thumbnails.backend.thumbnail_file(
+                post.image, geometry_string, options
+            ).key)
+            for post in posts
+        ]
+        kv_cache = default.kvstore.cache
+
+        def one_by_one(page):
+            for post in page:
+                thumbnails.get_thumbnail(post.image, 'card')
+
+        def batched(page):
+            thumbnails.prefetch_thumbnails(page, 'card')
+
+        for warm in (False, True):
+            for label, lookup in (
+                ('по одной', one_by_one), ('пачкой', batched)
+            ):
+                page = list(Post.objects.filter(author=author))
+                if not warm:
+                    kv_cache.delete_many(keys)
+                with record_queries() as log, \
+                        count_cache_calls(kv_cache) as calls:
+                    lookup(page)
+                self.stdout.write(
+                    f'{"тёплый" if warm else "холодный"} кеш, {label:<9}: '
+                    f'{len(calls)} обращений к кешу, '
+                    f'{len(log)} SQL-запросов на {count} постов'
+                )
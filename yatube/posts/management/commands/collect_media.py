@@ -0,0 +1,134 @@
+import itertools
+import os
+import shutil
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import media
+from posts.models import Post, StoredFile
+from posts.storage import post_image_storage
+
+
+def batches(names, size):
+    names = iter(names)
+    while True:
+        batch = list(itertools.islice(names, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, варианты и миниатюры, на которые не ссылается '
+        'ни один пост. Сливает отсортированные имена из базы с обходом '
+        'каталогов, поэтому память не растёт с числом файлов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено'
+        )
+        parser.add_argument(
+            '--quarantine',
+            help='Переносить файлы в этот каталог вместо удаления'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60 * 24,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+        parser.add_argument(
+            '--buffer-size', type=int, default=100000,
+            help='Сколько имён сортировать в памяти до сброса на диск'
+        )
+
+    def handle(self, *args, **options):
+        stale = self.collect_stale_thumbnails(options)
+        location = post_image_storage.location
+        directories = sorted([
+            sorl_settings.THUMBNAIL_PREFIX.strip('/'),
+            Post._meta.get_field('image').upload_to.strip('/'),
+        ])
+        stored = itertools.chain.from_iterable(
+            media.stored_names(location, directory)
+            for directory in directories
+        )
+        referenced = media.sorted_names(
+            itertools.chain(
+                media.post_image_names(), media.kvstore_names(True)
+            ),
+            options['buffer_size']
+        )
+        orphans = self.old_enough(
+            media.orphaned_names(stored, referenced),
+            location, options['min_age']
+        )
+        removed = 0
+        for batch in batches(orphans, options['batch_size']):
+            removed += self.remove(batch, location, options)
+            self.stdout.write(f'Обработано {removed} файлов')
+        verb = 'Найдено' if options['dry_run'] else 'Убрано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, '
+            f'исходников с устаревшими миниатюрами: {stale}'
+        ))
+
+    def collect_stale_thumbnails(self, options):
+        """Миниатюры картинок, которых нет у постов, удаляются через sorl.
+
+        Так из KVStore уходят и записи о них, иначе эти миниатюры
+        считались бы используемыми.
+        """
+        buffer_size = options['buffer_size']
+        sources = media.orphaned_names(
+            media.sorted_names(media.kvstore_names(False), buffer_size),
+            media.sorted_names(media.post_image_names(), buffer_size)
+        )
+        found = 0
+        for batch in batches(sources, options['batch_size']):
+            found += len(batch)
+            if options['dry_run']:
+                continue
+            for name in batch:
+                delete_thumbnails(
+                    ImageFile(name, post_image_storage), delete_file=False
+                )
+        return found
+
+    def old_enough(self, names, location, min_age):
+        deadline = time.time() - min_age
+        for name in names:
+            try:
+                modified = os.lstat(os.path.join(location, name)).st_mtime
+            except FileNotFoundError:
+                continue
+            if modified <= deadline:
+                yield name
+
+    def remove(self, batch, location, options):
+        # Пост мог сослаться на файл уже после того, как прочитали базу.
+        batch = set(batch) - set(Post.objects.filter(
+            image__in=batch
+        ).values_list('image', flat=True))
+        for name in sorted(batch):
+            path = os.path.join(location, name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            elif options['quarantine']:
+                target = os.path.join(options['quarantine'], name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        if not options['dry_run']:
+            StoredFile.objects.filter(name__in=batch).delete()
+        return len(batch)
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exports
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии и подписки автора или группы '
+        'в JSONL или CSV, читая базу пачками по id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument(
+            '--format', choices=tuple(exports.CONTENT_TYPES), default='jsonl'
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл или - для stdout'
+        )
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        author = group = None
+        try:
+            if options['author']:
+                author = User.objects.get(username=options['author'])
+            if options['group']:
+                group = Group.objects.get(slug=options['group'])
+        except (User.DoesNotExist, Group.DoesNotExist) as error:
+            raise CommandError(error)
+        rows = exports.export_rows(author, group, options['chunk_size'])
+        chunks = exports.stream(rows, options['format'])
+        output = options['output']
+        if output == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as file:
+            file.writelines(chunks)
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {output}'))
@@ -0,0 +1,237 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from core import page_cache
+from posts import (
+    author_timelines, caching, counters, media, placeholders, timeline
+)
+from posts.bulk import bulk_create_posts
+from posts.models import Group, Post
+from posts.storage import post_image_storage
+
+User = get_user_model()
+
+
+def read_rows(stream, data_format):
+    """Строки входного потока как словари, по одной за раз.
+
+    Комментарии и подписки из выгрузки export_posts пропускаются.
+    """
+    if data_format == 'csv':
+        rows = csv.DictReader(stream)
+    else:
+        rows = (json.loads(line) for line in stream if line.strip())
+    for row in rows:
+        if (row.get('type') or 'post') == 'post':
+            yield row
+
+
+class Lookup:
+    """Отображение ключа (username, slug) в id с ограниченным размером.
+
+    Недостающие ключи пачки выбираются одним запросом и, если разрешено,
+    создаются одним bulk_create. При переполнении словарь очищается,
+    поэтому память не растёт с числом строк.
+    """
+
+    def __init__(self, model, field, build=None, limit=100000):
+        self.model = model
+        self.field = field
+        self.build = build
+        self.limit = limit
+        self.ids = {}
+
+    def fetch(self, keys):
+        return dict(self.model.objects.filter(
+            **{f'{self.field}__in': keys}
+        ).values_list(self.field, 'pk'))
+
+    def resolve(self, keys):
+        keys = {key for key in keys if key}
+        missing = keys - self.ids.keys()
+        if not missing:
+            return
+        if len(self.ids) + len(missing) > self.limit:
+            self.ids.clear()
+            missing = keys
+        found = self.fetch(missing)
+        if self.build is not None and len(found) < len(missing):
+            self.model.objects.bulk_create(
+                [self.build(key) for key in missing - found.keys()],
+                ignore_conflicts=True
+            )
+            found = self.fetch(missing)
+        self.ids.update(found)
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты из JSONL или CSV: text, author, group, '
+        'pub_date, image. Пишет пачками через bulk_create и сама '
+        'обновляет то, что при сохранении поста делают сигналы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--media-dir', default='',
+            help='Каталог, от которого считаются относительные пути картинок'
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать неизвестных авторов без пароля'
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать неизвестные группы с заголовком из slug'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        self.media_dir = options['media_dir']
+        self.images = {}
+        self.authors = Lookup(User, 'username', build=(
+            self.build_author if options['create_authors'] else None
+        ))
+        self.groups = Lookup(Group, 'slug', build=(
+            self.build_group if options['create_groups'] else None
+        ))
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, newline='', encoding='utf-8')
+        )
+        started = time.perf_counter()
+        imported, skipped = 0, 0
+        rows = enumerate(read_rows(stream, data_format), 1)
+        try:
+            while True:
+                batch = list(itertools.islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    created = self.import_batch(batch)
+                imported += created
+                skipped += len(batch) - created
+                self.stdout.write(
+                    f'Строк {batch[-1][0]}, импортировано {imported}, '
+                    f'пропущено {skipped}, '
+                    f'{imported / (time.perf_counter() - started):.0f} '
+                    f'строк/с'
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {imported} постов, пропущено {skipped}. Миниатюры '
+            f'создаст rebuild_thumbnails, до тех пор - первый показ.'
+        ))
+
+    def build_author(self, username):
+        return User(username=username, password=make_password(None))
+
+    def build_group(self, slug):
+        return Group(slug=slug, title=slug, description='')
+
+    def import_batch(self, batch):
+        self.authors.resolve({row.get('author') for _, row in batch})
+        self.groups.resolve({row.get('group') for _, row in batch})
+        posts = []
+        for line, row in batch:
+            try:
+                posts.append(self.build_post(row))
+            except (CommandError, OSError, ValueError) as error:
+                self.stderr.write(f'Строка {line}: {error}')
+        if not posts:
+            return 0
+        ids = bulk_create_posts(posts)
+        created = list(Post.objects.filter(pk__in=ids).values_list(
+            'pk', 'author_id', 'group_id', 'image', 'pub_date'
+        ))
+        self.after_insert(created)
+        return len(created)
+
+    def build_post(self, row):
+        text = (row.get('text') or '').strip()
+        if not text:
+            raise CommandError('пустой текст')
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            raise CommandError(f'нет автора {row.get("author")!r}')
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                raise CommandError(f'нет группы {row["group"]!r}')
+        pub_date = timezone.now()
+        if row.get('pub_date'):
+            pub_date = parse_datetime(row['pub_date'])
+            if pub_date is None:
+                raise CommandError(f'неверная дата {row["pub_date"]!r}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        image, placeholder = self.store_image(row.get('image'))
+        return Post(
+            text=text, author_id=author_id, group_id=group_id,
+            pub_date=pub_date, image=image, image_placeholder=placeholder
+        )
+
+    def store_image(self, path):
+        """Кладёт картинку в хранилище; повторные пути не читаются заново."""
+        if not path:
+            return '', ''
+        path = os.path.join(self.media_dir, path)
+        if path not in self.images:
+            if len(self.images) > 10000:
+                self.images.clear()
+            with open(path, 'rb') as file:
+                try:
+                    placeholder = placeholders.build_placeholder(file)
+                except (Image.UnidentifiedImageError,
+                        Image.DecompressionBombError) as error:
+                    raise CommandError(f'{path}: {error}')
+                name = post_image_storage.save(
+                    'posts/' + os.path.basename(path), File(file)
+                )
+            self.images[path] = name, placeholder
+        return self.images[path]
+
+    def after_insert(self, created):
+        """То, что для одного поста делают сигналы post_save."""
+        authors = Counter(author_id for _, author_id, *_ in created)
+        groups = Counter(group_id for _, _, group_id, *_ in created)
+        for author_id, total in authors.items():
+            counters.bump_user(author_id, posts_count=total)
+            author_timelines.refresh_author_timeline(author_id)
+        for group_id, total in groups.items():
+            counters.bump_group(group_id, total)
+        media.acquire_many(Counter(
+            image for _, _, _, image, _ in created if image
+        ))
+        timeline.fan_out_posts(
+            (pk, author_id, pub_date)
+            for pk, author_id, _, _, pub_date in created
+        )
+        caching.bump_versions([caching.GROUPS_SCOPE])
+        page_cache.purge_all()
@@ -0,0 +1,101 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from core import page_cache
+from posts import caching, media, variants
+from posts.models import Post, StoredFile
+from posts.storage import is_hashed_name, post_image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами из хеша '
+        'содержимого. Работает пачками, можно прервать и запустить снова.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_id, moved = 0, 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_id).exclude(image='')
+                .order_by('pk')
+                .values_list('pk', 'image', 'image_variants')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            legacy = [row for row in batch if not is_hashed_name(row[1])]
+            with transaction.atomic():
+                moved_files = [self.move(*row) for row in legacy]
+            moved_files = [files for files in moved_files if files]
+            if moved_files:
+                # Версия 'groups' входит в ключ каждой ленты: фрагменты
+                # со старыми адресами картинок больше не отдаются.
+                # Страницы целиком сбрасываются так же.
+                caching.bump_versions([caching.GROUPS_SCOPE])
+                page_cache.purge_all()
+            # Старые файлы удаляем только после коммита новых имён.
+            for old_files in moved_files:
+                self.delete_legacy(*old_files)
+            moved += len(moved_files)
+            self.stdout.write(
+                f'Перенесено {moved}, последний id {last_id}, '
+                f'{moved / (time.perf_counter() - started):.0f} файлов/с'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Готово: {moved} картинок'))
+
+    def move(self, pk, name, image_variants):
+        if not post_image_storage.exists(name):
+            self.stderr.write(f'Пост {pk}: нет файла {name}')
+            return None
+        with post_image_storage.open(name) as file:
+            new_name = post_image_storage.save(name, file)
+        metadata = variants.load(image_variants)
+        old_variants = []
+        if metadata:
+            old_variants = [
+                variant for candidates in metadata['sources'].values()
+                for variant, _ in candidates
+            ]
+            metadata['sources'] = {
+                mime_type: [
+                    [self.move_variant(variant, new_name, width), width]
+                    for variant, width in candidates
+                ]
+                for mime_type, candidates in metadata['sources'].items()
+            }
+        Post.objects.filter(pk=pk).update(
+            image=new_name,
+            image_variants=variants.dump(metadata) if metadata else '',
+            updated=timezone.now()
+        )
+        StoredFile.objects.filter(name=name).delete()
+        media.acquire(new_name)
+        return name, old_variants
+
+    def move_variant(self, variant, new_name, width):
+        extension = os.path.splitext(variant)[1]
+        target = f'{os.path.splitext(new_name)[0]}.w{width}{extension}'
+        if not post_image_storage.exists(target):
+            with post_image_storage.open(variant) as file:
+                post_image_storage.save_derived(target, file)
+        return target
+
+    def delete_legacy(self, name, old_variants):
+        if Post.objects.filter(image=name).exists():
+            return
+        delete_thumbnails(ImageFile(name, post_image_storage), False)
+        for variant in old_variants:
+            post_image_storage.delete(variant)
+        post_image_storage.delete(name)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError(
+                'Полнотекстовый индекс работает только в SQLite'
+            )
+        search.install()
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Готово, постов: {indexed}'))
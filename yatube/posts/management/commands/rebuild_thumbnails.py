@@ -0,0 +1,156 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import page_cache
+from core.management.helpers import close_connections
+from posts import caching, thumbnails, variants
+from posts.models import Post
+from posts.storage import post_image_storage
+
+
+def render_image(task):
+    """Работа одного процесса: миниатюры sorl и, если нужно, варианты."""
+    name, build_variants = task
+    try:
+        thumbnails.generate(name)
+        metadata = None
+        if build_variants:
+            metadata = variants.dump(
+                variants.build_variants(name, post_image_storage)
+            )
+        return name, metadata, None
+    except Exception as error:
+        return name, None, f'{type(error).__name__}: {error}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздаёт миниатюры и варианты картинок постов в пуле процессов. '
+        'Запоминает последний обработанный id и продолжает с него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - в текущем процессе'
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--max-rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду; 0 - без ограничения'
+        )
+        parser.add_argument(
+            '--variants', action='store_true',
+            help='Пересоздать варианты srcset и у постов, где они уже есть'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.rebuild_thumbnails'),
+            help='Файл с прогрессом для продолжения после прерывания'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не читая сохранённый прогресс'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        state = self.load_checkpoint(checkpoint, options['restart'])
+        executor = None
+        if options['workers']:
+            close_connections()
+            # fork: дочерние процессы получают уже настроенный Django.
+            executor = ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=close_connections
+            )
+        started = time.perf_counter()
+        done, failed = 0, 0
+        try:
+            while True:
+                batch = list(
+                    Post.objects.filter(pk__gt=state['last_id'])
+                    .exclude(image='').order_by('pk')
+                    .values_list('pk', 'image', 'image_variants')
+                    [:options['batch_size']]
+                )
+                if not batch:
+                    break
+                tasks = self.batch_tasks(batch, options['variants'])
+                failed += self.save_results(
+                    executor.map(render_image, tasks) if executor
+                    else map(render_image, tasks)
+                )
+                # Фрагменты лент и страницы могли закешировать заглушки
+                # вместо картинок.
+                caching.bump_versions([caching.GROUPS_SCOPE])
+                page_cache.purge_all()
+                done += len(tasks)
+                state = {
+                    'last_id': batch[-1][0],
+                    'done': state['done'] + len(tasks),
+                }
+                self.save_checkpoint(checkpoint, state)
+                self.report(state, done, started, options['max_rate'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {state["done"]} картинок, ошибок: {failed}'
+        ))
+
+    def load_checkpoint(self, path, restart):
+        if restart or not os.path.exists(path):
+            return {'last_id': 0, 'done': 0}
+        with open(path) as file:
+            state = json.load(file)
+        self.stdout.write(f'Продолжаем после поста {state["last_id"]}')
+        return state
+
+    def batch_tasks(self, batch, rebuild_variants):
+        """Одна задача на файл: одинаковые картинки хранятся один раз."""
+        tasks = {}
+        for _, name, image_variants in batch:
+            rebuild = rebuild_variants or not image_variants
+            tasks[name] = tasks.get(name, False) or rebuild
+        return list(tasks.items())
+
+    def report(self, state, done, started, max_rate):
+        """Печатает скорость и ждёт, если она выше max_rate картинок/с."""
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Обработано {state["done"]}, последний id '
+            f'{state["last_id"]}, {done / elapsed:.1f} картинок/с'
+        )
+        if max_rate:
+            pause = done / max_rate - elapsed
+            if pause > 0:
+                time.sleep(pause)
+
+    def save_results(self, results):
+        failed = 0
+        for name, metadata, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            elif metadata is not None:
+                Post.objects.filter(image=name).update(
+                    image_variants=metadata, updated=timezone.now()
+                )
+        return failed
+
+    def save_checkpoint(self, path, state):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary, path)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, групп, подписок '
+        'и ссылок на файлы картинок'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = counters.recount()
+        for name, total in updated.items():
+            self.stdout.write(f'{name}: {total}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,366 @@
+import io
+import itertools
+import math
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from PIL import Image, ImageDraw
+
+from core import page_cache
+from core.sqlite import bulk_create_ids
+from posts import caching, counters, media, placeholders, timeline
+from posts.bulk import bulk_create_posts
+from posts.models import Comment, Follow, Group, Post
+from posts.storage import post_image_storage
+
+User = get_user_model()
+
+# Размеры наборов для замеров. Отдельные параметры можно переопределить.
+PRESETS = {
+    'tiny': {
+        'users': 100, 'groups': 5, 'posts': 2000, 'follows': 10,
+        'comments': 5000,
+    },
+    'small': {
+        'users': 2000, 'groups': 20, 'posts': 50000, 'follows': 20,
+        'comments': 100000,
+    },
+    'medium': {
+        'users': 20000, 'groups': 100, 'posts': 250000, 'follows': 30,
+        'comments': 500000,
+    },
+    'large': {
+        'users': 100000, 'groups': 500, 'posts': 1000000, 'follows': 30,
+        'comments': 2000000,
+    },
+}
+
+WORDS = (
+    'утро вечер город дорога книга письмо море лес река поле дом окно '
+    'друг сосед кошка собака чай кофе дождь снег солнце ветер поезд '
+    'вокзал музей театр песня кино работа отпуск праздник рынок сад '
+    'новый старый тихий шумный тёплый холодный долгий короткий весёлый '
+    'читал писал видел слышал гулял ждал нашёл потерял думал вспомнил '
+    'сегодня вчера снова опять почти совсем очень немного наконец'
+).split()
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена', 'Алексей',
+    'Наталья', 'Дмитрий', 'Татьяна', 'Михаил',
+)
+
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев',
+    'Козлов', 'Новиков', 'Морозов', 'Волков',
+)
+
+
+def zipf_cum_weights(count, alpha):
+    """Накопленные веса рангов 1..count для random.choices.
+
+    Вес ранга r пропорционален 1 / r ** alpha: немногие авторы пишут
+    большую часть постов и собирают большую часть подписчиков.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)
+    ))
+
+
+def scatter(count):
+    """Шаг, который переставляет индексы 0..count-1 без повторов.
+
+    Популярные по рангу посты оказываются разбросаны по всей ленте,
+    а не собраны в её начале.
+    """
+    step = 1000003
+    while math.gcd(step, count) != 1:
+        step += 2
+    return step
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'подписками и комментариями для замеров. Авторы распределены по '
+        'степенному закону, данные зависят только от --seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--preset', choices=PRESETS, default='small',
+            help='Готовый размер набора'
+        )
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--groups', type=int)
+        parser.add_argument('--posts', type=int)
+        parser.add_argument(
+            '--follows', type=int, help='Подписок на пользователя в среднем'
+        )
+        parser.add_argument('--comments', type=int)
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок создать для постов'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой, если картинки создаются'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона для авторов'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--start', default='2020-01-01',
+            help='Дата первого поста'
+        )
+        parser.add_argument(
+            '--epoch', default='2024-01-01',
+            help='Дата последнего поста. Постоянная, а не сегодняшняя: '
+                 'даты постов зависят только от параметров'
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и slug групп'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-timelines', action='store_true',
+            help='Не раскладывать посты по лентам подписок; потом их '
+                 'соберёт rebuild_timelines'
+        )
+
+    def handle(self, *args, **options):
+        sizes = {
+            name: options[name] if options[name] is not None else value
+            for name, value in PRESETS[options['preset']].items()
+        }
+        start, epoch = parse_date(options['start']), parse_date(
+            options['epoch']
+        )
+        for name, value in (('start', start), ('epoch', epoch)):
+            if value is None:
+                raise CommandError(f'неверная дата {options[name]!r}')
+        if epoch <= start:
+            raise CommandError('--epoch должна быть позже --start')
+        self.prefix = options['prefix']
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {self.prefix!r} уже есть: '
+                f'задайте другой --prefix'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+
+        user_ids = self.create_users(sizes['users'])
+        group_ids = self.create_groups(sizes['groups'])
+        self.create_follows(user_ids, sizes['follows'], options['alpha'])
+        images = self.create_images(options['images'])
+        post_ids = self.create_posts(
+            user_ids, group_ids, images, sizes['posts'], options,
+            start, epoch
+        )
+        self.create_comments(user_ids, post_ids, sizes['comments'])
+        self.log('Счётчики')
+        with transaction.atomic():
+            counters.recount()
+        caching.bump_versions([caching.GROUPS_SCOPE])
+        page_cache.purge_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - self.started:.0f} с: '
+            f'{len(user_ids)} пользователей, {len(post_ids)} постов. '
+            f'Миниатюры создаст rebuild_thumbnails.'
+        ))
+
+    def log(self, message):
+        self.stdout.write(
+            f'[{time.perf_counter() - self.started:7.1f} с] {message}'
+        )
+
+    def create_users(self, total):
+        # Пустой пароль: хеширование настоящего заняло бы больше всего.
+        password = make_password(None)
+        user_ids = []
+        for start, size in chunks(total, self.batch_size):
+            user_ids += bulk_create_ids(User, [
+                User(
+                    username=f'{self.prefix}{number}',
+                    password=password,
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                )
+                for number in range(start, start + size)
+            ])
+        self.log(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_groups(self, total):
+        group_ids = bulk_create_ids(Group, [
+            Group(
+                title=f'Группа {number}',
+                slug=f'{self.prefix}-group-{number}',
+                description=self.text(10, 40),
+            )
+            for number in range(total)
+        ])
+        self.log(f'Групп: {len(group_ids)}')
+        return group_ids
+
+    def create_follows(self, user_ids, average, alpha):
+        """Подписки: популярных авторов читают чаще.
+
+        Популярность не совпадает с тем, сколько автор пишет: иначе
+        самые плодовитые авторы раздували бы ленты всех подписчиков.
+        """
+        if not average or len(user_ids) < 2:
+            return
+        weights = zipf_cum_weights(len(user_ids), alpha)
+        popular = list(user_ids)
+        self.rng.shuffle(popular)
+        batch, created = [], 0
+        for user_id in user_ids:
+            count = min(
+                len(user_ids) - 1, int(self.rng.expovariate(1 / average))
+            )
+            authors = set(
+                self.rng.choices(popular, cum_weights=weights, k=count)
+            )
+            authors.discard(user_id)
+            batch += [
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in sorted(authors)
+            ]
+            if len(batch) >= self.batch_size:
+                created += self.save_follows(batch)
+                batch = []
+        created += self.save_follows(batch)
+        # Кеш популярных авторов нужен свежим до раскладки постов.
+        cache.delete(timeline.PULLED_AUTHORS_KEY)
+        self.log(f'Подписок: {created}')
+
+    def save_follows(self, batch):
+        with transaction.atomic():
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
+
+    def create_images(self, total):
+        """Картинки с разным цветом и узором и их заглушки."""
+        images = []
+        for number in range(total):
+            image = Image.new('RGB', (960, 540), tuple(
+                self.rng.randrange(256) for _ in range(3)
+            ))
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                x, y = self.rng.randrange(960), self.rng.randrange(540)
+                radius = self.rng.randrange(20, 200)
+                draw.ellipse(
+                    (x - radius, y - radius, x + radius, y + radius),
+                    fill=tuple(self.rng.randrange(256) for _ in range(3))
+                )
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            buffer.seek(0)
+            placeholder = placeholders.build_placeholder(buffer)
+            name = post_image_storage.save(
+                f'posts/{self.prefix}-{number}.jpg',
+                ContentFile(buffer.getvalue())
+            )
+            images.append((name, placeholder))
+        if images:
+            self.log(f'Картинок: {len(images)}')
+        return images
+
+    def create_posts(self, user_ids, group_ids, images, total, options,
+                     start, epoch):
+        weights = zipf_cum_weights(len(user_ids), options['alpha'])
+        group_weights = zipf_cum_weights(len(group_ids), 1) if group_ids \
+            else None
+        first, last = (
+            timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            for day in (start, epoch)
+        )
+        span = (last - first).total_seconds()
+        post_ids = []
+        for offset, size in chunks(total, self.batch_size):
+            authors = self.rng.choices(
+                user_ids, cum_weights=weights, k=size
+            )
+            posts = []
+            for number, author_id in enumerate(authors, offset):
+                group_id = None
+                if group_ids and self.rng.random() < 0.6:
+                    group_id = self.rng.choices(
+                        group_ids, cum_weights=group_weights
+                    )[0]
+                image, placeholder = '', ''
+                if images and self.rng.random() < options['image_ratio']:
+                    image, placeholder = self.rng.choice(images)
+                # Даты растут с номером поста, как у живой ленты.
+                seconds = span * (number + self.rng.random()) / total
+                posts.append(Post(
+                    text=self.text(5, 120),
+                    author_id=author_id,
+                    group_id=group_id,
+                    pub_date=first + timedelta(seconds=seconds),
+                    image=image,
+                    image_placeholder=placeholder,
+                ))
+            ids = bulk_create_posts(posts)
+            post_ids += ids
+            self.after_posts(ids, posts, options['no_timelines'])
+            self.log(f'Постов: {len(post_ids)}')
+        return post_ids
+
+    def after_posts(self, ids, posts, no_timelines):
+        media.acquire_many(Counter(
+            post.image.name for post in posts if post.image
+        ))
+        if ids and not no_timelines:
+            timeline.fan_out_post_range(ids[0], ids[-1])
+
+    def create_comments(self, user_ids, post_ids, total):
+        """Комментарии: у немногих постов обсуждения длинные."""
+        if not post_ids or not total:
+            return
+        weights = zipf_cum_weights(len(post_ids), 1)
+        step = scatter(len(post_ids))
+        ranks = range(len(post_ids))
+        created = 0
+        for _, size in chunks(total, self.batch_size):
+            comments = [
+                Comment(
+                    post_id=post_ids[rank * step % len(post_ids)],
+                    author_id=self.rng.choice(user_ids),
+                    text=self.text(2, 30),
+                )
+                for rank in self.rng.choices(
+                    ranks, cum_weights=weights, k=size
+                )
+            ]
+            with transaction.atomic():
+                Comment.objects.bulk_create(comments)
+            created += size
+        self.log(f'Комментариев: {created}')
+
+    def text(self, shortest, longest):
+        # Длина по треугольному распределению: коротких текстов больше.
+        length = int(self.rng.triangular(shortest, longest, shortest))
+        words = self.rng.choices(WORDS, k=max(length, 1))
+        return ' '.join(words).capitalize() + '.'
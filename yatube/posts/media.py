@@ -0,0 +1,212 @@
+import heapq
+import json
+import logging
+import os
+import tempfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import variants
+from .models import Post, StoredFile
+from .storage import is_hashed_name, post_image_storage
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    """Отмечает, что ещё один пост ссылается на файл."""
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    )
+    if not updated:
+        StoredFile.objects.create(name=name, references=1)
+
+
+def acquire_many(counts):
+    """acquire для пачки: counts - имя файла -> число новых ссылок."""
+    existing = set(StoredFile.objects.filter(
+        name__in=counts
+    ).values_list('name', flat=True))
+    for name in existing:
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') + counts[name]
+        )
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, references=total)
+        for name, total in counts.items() if name not in existing
+    )
+
+
+def release(name, storage=post_image_storage):
+    """Снимает ссылку поста с файла.
+
+    Файл, на который больше никто не ссылается, удаляется после коммита
+    вместе с вариантами и миниатюрами.
+    """
+    if not name:
+        return
+    StoredFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: collect(name, storage))
+
+
+def variant_names(name, storage):
+    """Варианты картинки лежат рядом с ней: <хеш>.w<ширина>.<ext>.
+
+    Каталог читается только для имён из хеша: в нём единицы файлов.
+    """
+    if not is_hashed_name(name):
+        return []
+    directory, filename = os.path.split(name)
+    prefix = os.path.splitext(filename)[0] + '.w'
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, file) for file in files
+        if file.startswith(prefix)
+    ]
+
+
+def collect(name, storage=post_image_storage):
+    deleted, _ = StoredFile.objects.filter(name=name, references=0).delete()
+    if not deleted or Post.objects.filter(image=name).exists():
+        return
+    # Ошибка удаления не должна ронять запрос: файл просто останется.
+    try:
+        delete_thumbnails(ImageFile(name, storage), delete_file=False)
+        for variant in variant_names(name, storage):
+            storage.delete(variant)
+        storage.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить файл %s', name)
+
+
+def recount_references():
+    """Пересчитывает ссылки на файлы по таблице постов."""
+    StoredFile.objects.all().delete()
+    # Без order_by() поле сортировки Post попало бы в GROUP BY.
+    references = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(
+        total=Count('pk')
+    ).values_list('image', 'total')
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, references=total)
+        for name, total in references.iterator()
+    )
+    return StoredFile.objects.count()
+
+
+def post_image_names():
+    """Имена картинок постов и их вариантов srcset, без сортировки."""
+    posts = Post.objects.exclude(image='').values_list(
+        'image', 'image_variants'
+    ).order_by().iterator(chunk_size=2000)
+    for name, image_variants in posts:
+        yield name
+        metadata = variants.load(image_variants)
+        if metadata:
+            for candidates in metadata['sources'].values():
+                for variant, _ in candidates:
+                    yield variant
+
+
+def kvstore_names(thumbnails):
+    """Имена файлов из KVStore sorl-thumbnail.
+
+    thumbnails=True - сами миниатюры, иначе - исходники, для которых
+    они сделаны.
+    """
+    values = KVStoreModel.objects.filter(
+        key__startswith=add_prefix('')
+    ).values_list('value', flat=True).iterator(chunk_size=2000)
+    for value in values:
+        name = json.loads(value).get('name') or ''
+        if name.startswith(sorl_settings.THUMBNAIL_PREFIX) == thumbnails:
+            yield name
+
+
+def _write_run(names):
+    run = tempfile.TemporaryFile('w+', encoding='utf-8')
+    for name in sorted(names):
+        run.write(name + '\n')
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    for line in run:
+        yield line[:-1]
+
+
+def sorted_names(names, buffer_size=100000):
+    """Сортирует поток имён без повторов, держа в памяти buffer_size имён.
+
+    Отсортированные куски сбрасываются во временные файлы и сливаются
+    через heapq.merge. Поток читается целиком до первого имени, поэтому
+    курсор базы не остаётся открытым, пока вызывающий удаляет файлы.
+    """
+    runs, buffer = [], []
+    try:
+        for name in names:
+            if '\n' in name:
+                continue
+            buffer.append(name)
+            if len(buffer) >= buffer_size:
+                runs.append(_write_run(buffer))
+                buffer = []
+        buffer.sort()
+        previous = None
+        streams = [_read_run(run) for run in runs] + [iter(buffer)]
+        for name in heapq.merge(*streams):
+            if name != previous:
+                yield name
+                previous = name
+    finally:
+        for run in runs:
+            run.close()
+
+
+def stored_names(location, directory):
+    """Файлы каталога хранилища в порядке сортировки строк их имён.
+
+    Каталог сортируется как «имя/», тогда обход совпадает с ORDER BY
+    по полному имени и его можно сливать с отсортированным потоком.
+    """
+    try:
+        with os.scandir(os.path.join(location, directory)) as entries:
+            names = sorted(
+                entry.name + '/' if entry.is_dir(follow_symlinks=False)
+                else entry.name
+                for entry in entries
+            )
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('/'):
+            yield from stored_names(location, directory + '/' + name[:-1])
+        else:
+            yield directory + '/' + name
+
+
+def orphaned_names(stored, referenced):
+    """Имена из stored, которых нет в referenced; оба потока отсортированы."""
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for name in stored:
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if name != current:
+            yield name
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.utils.timezone
+
+
+def fill_timelines(apps, schema_editor):
+    """Дата для старых записей и записи для подписок до 0009.
+
+    0009 создала пустую таблицу: ленты подписок после обновления были
+    пустыми. Посты популярных авторов не раскладываются, как и в
+    posts.timeline.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    db_alias = schema_editor.connection.alias
+    TimelineEntry.objects.using(db_alias).update(pub_date=Subquery(
+        Post.objects.using(db_alias).filter(
+            pk=OuterRef('post_id')
+        ).order_by().values('pub_date')[:1]
+    ))
+    pulled = list(
+        Follow.objects.using(db_alias).values('author')
+        .annotate(followers=Count('pk'))
+        .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('author', flat=True)
+    )
+    exclude = ''
+    if pulled:
+        exclude = f'AND p.author_id NOT IN ({", ".join(["%s"] * len(pulled))})'
+    entries = TimelineEntry._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {Post._meta.db_table} p '
+            f'JOIN {Follow._meta.db_table} f ON f.author_id = p.author_id '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {entries} t '
+            f'WHERE t.user_id = f.user_id AND t.post_id = p.id) {exclude}',
+            pulled
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата публикации поста'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date'),
+        ),
+    ]
@@ -0,0 +1,208 @@
+import collections.abc
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.functional import SimpleLazyObject, cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+POST_ORDER_FIELDS = ('pub_date', 'pk')
+
+
+def encode_cursor(*values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    data = json.dumps([str(value) for value in values])
+    return urlsafe_base64_encode(data.encode())
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора. Для битого токена возвращает None."""
+    try:
+        values = json.loads(force_str(urlsafe_base64_decode(token)))
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list):
+        return None
+    return [str(value) for value in values]
+
+
+def post_cursor(post):
+    return encode_cursor(post.pub_date.isoformat(), post.pk)
+
+
+def parse_post_cursor(token):
+    """Возвращает пару (pub_date, id) из токена курсора поста."""
+    values = decode_cursor(token)
+    if values is None or len(values) != 2:
+        return None
+    try:
+        pub_date = parse_datetime(values[0])
+        pk = int(values[1])
+    except ValueError:
+        return None
+    # Курсоры выдаются с поясом: наивную дату нельзя сравнить с pub_date.
+    if pub_date is None or timezone.is_naive(pub_date):
+        return None
+    return pub_date, pk
+
+
+def comment_cursor(comment):
+    return encode_cursor(comment.created.isoformat(), comment.pk)
+
+
+# Курсор комментария устроен так же: пара (created, id).
+parse_comment_cursor = parse_post_cursor
+
+
+class KeysetPage(collections.abc.Sequence):
+    """Страница ленты, выбранная по курсору без OFFSET и COUNT(*)."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, cursor=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self._cursor = cursor or post_cursor
+
+    def __repr__(self):
+        return '<Keyset page of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self._cursor(self.object_list[-1])
+        return None
+
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self._cursor(self.object_list[0])
+        return None
+
+
+def _older(date_field, pk_field, pub_date, pk):
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(**{
+        date_field: pub_date, f'{pk_field}__lt': pk
+    })
+
+
+def _newer(date_field, pk_field, pub_date, pk):
+    return Q(**{f'{date_field}__gt': pub_date}) | Q(**{
+        date_field: pub_date, f'{pk_field}__gt': pk
+    })
+
+
+def keyset_page(queryset, after=None, before=None, per_page=None,
+                order_fields=POST_ORDER_FIELDS):
+    """Выбирает страницу постов после (или до) курсора (pub_date, id).
+
+    order_fields - поля даты и id, по которым сортируется выборка:
+    лента подписок сортирует по копиям из TimelineEntry.
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    date_field, pk_field = order_fields
+    if before is not None:
+        rows = list(queryset.filter(
+            _newer(date_field, pk_field, *before)
+        ).order_by(date_field, pk_field)[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], True, has_previous)
+    queryset = queryset.order_by(f'-{date_field}', f'-{pk_field}')
+    if after is not None:
+        queryset = queryset.filter(_older(date_field, pk_field, *after))
+    rows = list(queryset[:per_page + 1])
+    return KeysetPage(rows[:per_page], len(rows) > per_page, after is not None)
+
+
+def comment_page(queryset, after=None, per_page=None):
+    """Комментарии от новых к старым после курсора (created, id)."""
+    per_page = per_page or settings.COMMENTS_PER_PAGE
+    queryset = queryset.order_by('-created', '-pk')
+    if after is not None:
+        queryset = queryset.filter(_older('created', 'pk', *after))
+    rows = list(queryset[:per_page + 1])
+    return KeysetPage(
+        rows[:per_page], len(rows) > per_page, after is not None,
+        cursor=comment_cursor
+    )
+
+
+class FirstPagePaginator(Paginator):
+    """Paginator первой страницы ленты без COUNT(*).
+
+    Выбирает на один пост больше страницы: этого хватает, чтобы узнать,
+    есть ли следующая. Запрос выполняется при первом обращении к
+    странице, то есть внутри фрагмента {% cache %}, а не во view.
+    """
+
+    @cached_property
+    def rows(self):
+        return list(self.object_list[:self.per_page + 1])
+
+    @cached_property
+    def count(self):
+        return len(self.rows)
+
+    def first_page(self):
+        return self._get_page(
+            SimpleLazyObject(lambda: self.rows[:self.per_page]), 1, self
+        )
+
+
+def _add_cursors(page_obj):
+    """Добавляет странице Paginator методы курсоров, как у KeysetPage."""
+    def next_cursor():
+        if page_obj.has_next() and page_obj:
+            return post_cursor(page_obj[-1])
+        return None
+
+    def previous_cursor():
+        if page_obj.has_previous() and page_obj:
+            return post_cursor(page_obj[0])
+        return None
+
+    page_obj.next_cursor = next_cursor
+    page_obj.previous_cursor = previous_cursor
+    return page_obj
+
+
+def get_page_obj(request, queryset, order_fields=POST_ORDER_FIELDS):
+    """Страница ленты постов для запроса.
+
+    Параметры ?after=/?before= выбирают страницу по курсору, ?page=N -
+    старая постраничная навигация с COUNT(*). Без параметров первая
+    страница выбирается как по курсору, но остаётся обычным Page.
+    """
+    after = parse_post_cursor(request.GET.get('after', ''))
+    before = parse_post_cursor(request.GET.get('before', ''))
+    if after is not None or before is not None:
+        return keyset_page(
+            queryset, after=after, before=before, order_fields=order_fields
+        )
+    date_field, pk_field = order_fields
+    queryset = queryset.order_by(f'-{date_field}', f'-{pk_field}')
+    if 'page' in request.GET:
+        paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
+        return _add_cursors(paginator.get_page(request.GET['page']))
+    paginator = FirstPagePaginator(queryset, settings.POSTS_PER_PAGE)
+    page_obj = paginator.first_page()
+    page_obj.is_keyset = True
+    return _add_cursors(page_obj)
@@ -0,0 +1,50 @@
+import base64
+import io
+import logging
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def build_placeholder(file):
+    """data: URI крошечной размытой копии картинки, около полукилобайта.
+
+    JPEG декодируется сразу в уменьшенном виде (draft), поэтому расчёт
+    не требует полноразмерного кадра в памяти.
+    """
+    size = settings.IMAGE_PLACEHOLDER_SIZE
+    file.seek(0)
+    with Image.open(file) as image:
+        image.draft('RGB', (size * 8, size * 8))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+        image = image.convert('RGB').filter(ImageFilter.GaussianBlur(1))
+    file.seek(0)
+    buffer = io.BytesIO()
+    image.save(
+        buffer, 'JPEG', quality=settings.IMAGE_PLACEHOLDER_QUALITY,
+        optimize=True
+    )
+    data = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f'data:image/jpeg;base64,{data}'
+
+
+def placeholder_for(field_file):
+    """Заглушка для Post.image или '' если файл не прочитать."""
+    if not field_file:
+        return ''
+    try:
+        if not field_file._committed:
+            # Новая загрузка ещё не сохранена в хранилище.
+            return build_placeholder(field_file.file)
+        with field_file.storage.open(field_file.name) as file:
+            return build_placeholder(file)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        logger.warning(
+            'Не удалось построить заглушку для %s', field_file.name,
+            exc_info=True
+        )
+        return ''
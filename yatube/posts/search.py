@@ -0,0 +1,173 @@
+import re
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginators import KeysetPage, decode_cursor, encode_cursor
+
+FTS_TABLE = 'posts_post_fts'
+
+# Маркеры совпадений в snippet(): текст поста экранируется целиком,
+# и только потом маркеры заменяются на <mark>.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+TERM_RE = re.compile(r'\w+')
+
+INSTALL_SQL = [
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+]
+
+
+def is_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def _table_exists(cursor):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+        [FTS_TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def install(using='default'):
+    """Создаёт индекс FTS5 и триггеры синхронизации, если их нет.
+
+    Вызывается после каждого migrate: при перестройке таблицы posts_post
+    (ALTER в SQLite) Django удаляет триггеры вместе со старой таблицей.
+    """
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        created = not _table_exists(cursor)
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+        if created:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def rebuild(using='default'):
+    """Перестраивает индекс по posts_post, возвращает число постов.
+
+    Команда FTS5 'rebuild' читает таблицу с содержимым и пишет индекс
+    одной инструкцией: запись в базу заблокирована до конца, и триггеры
+    не добавят пост в индекс второй раз, как при заполнении пачками.
+    """
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+        cursor.execute('SELECT COUNT(*) FROM posts_post')
+        return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH: все слова по префиксу."""
+    return ' '.join(f'"{term}"*' for term in TERM_RE.findall(query))
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def search_cursor(post):
+    return encode_cursor(repr(post.search_rank), post.pk)
+
+
+def parse_search_cursor(token):
+    values = decode_cursor(token)
+    if values is None or len(values) != 2 or not values[1].isdigit():
+        return None
+    try:
+        return float(values[0]), int(values[1])
+    except ValueError:
+        return None
+
+
+def search_page(query, after=None, per_page=None):
+    """Страница результатов поиска по bm25 с курсором (rank, id).
+
+    У найденных постов заполняются search_rank и search_snippet.
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    expression = match_expression(query)
+    if not expression:
+        return KeysetPage([], False, False, cursor=search_cursor)
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}), '
+        f"snippet({FTS_TABLE}, 0, %s, %s, '…', %s) "
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+    )
+    params = [
+        MATCH_START, MATCH_END, settings.SEARCH_SNIPPET_TOKENS, expression
+    ]
+    if after is not None:
+        sql += f'AND (bm25({FTS_TABLE}), rowid) > (%s, %s) '
+        params += list(after)
+    sql += f'ORDER BY bm25({FTS_TABLE}), rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _, _ in rows]
+    )
+    results = []
+    for pk, rank, snippet in rows:
+        if pk in posts:
+            post = posts[pk]
+            post.search_rank = rank
+            post.search_snippet = highlight(snippet)
+            results.append(post)
+    return KeysetPage(
+        results, has_next, after is not None, cursor=search_cursor
+    )
+
+
+def icontains_page(query, per_page=None):
+    """Поиск через LIKE для баз без FTS5 и для сравнения скорости."""
+    per_page = per_page or settings.POSTS_PER_PAGE
+    posts = Post.objects.select_related('author', 'group')
+    for term in TERM_RE.findall(query):
+        posts = posts.filter(text__icontains=term)
+    return list(posts.order_by('-pub_date', '-pk')[:per_page])
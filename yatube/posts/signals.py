@@ -0,0 +1,121 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import page_cache
+
+from . import (
+    author_timelines, caching, counters, media, placeholders, timeline
+)
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw, **kwargs):
+    instance._old_group_id = None
+    instance._old_image = None
+    if instance.pk and not raw:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+        if _image_changed(instance):
+            instance.image_variants = ''
+    if not raw and _image_changed(instance):
+        instance.image_placeholder = placeholders.placeholder_for(
+            instance.image
+        )
+
+
+def _image_changed(post):
+    return (post._old_image or '') != (post.image.name or '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    caching.bump_post_feeds(instance, [instance._old_group_id])
+    page_cache.purge_paths(
+        caching.post_pages(instance, [instance._old_group_id])
+    )
+    if _image_changed(instance):
+        media.release(instance._old_image)
+        media.acquire(instance.image.name)
+    if created:
+        timeline.fan_out_post(instance)
+        author_timelines.refresh_author_timeline(instance.author_id)
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+    elif instance._old_group_id != instance.group_id:
+        counters.bump_group(instance._old_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump_post_feeds(instance)
+    page_cache.purge_paths(caching.post_pages(instance))
+    media.release(instance.image.name)
+    author_timelines.refresh_author_timeline(instance.author_id)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        caching.bump_group_feeds(instance)
+        page_cache.purge_all()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    caching.bump_group_feeds(instance)
+    page_cache.purge_all()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_post_comments(instance.post_id, 1)
+        caching.bump_versions([caching.comments_scope(instance.post_id)])
+        _purge_post_page(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post_comments(instance.post_id, -1)
+    caching.bump_versions([caching.comments_scope(instance.post_id)])
+    _purge_post_page(instance.post_id)
+
+
+def _purge_post_page(post_id):
+    page_cache.purge_paths([reverse('posts:post_detail', args=[post_id])])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        caching.bump_versions([f'follow:{instance.user_id}'])
+        timeline.backfill(instance.user_id, instance.author_id)
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        _purge_profiles(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    caching.bump_versions([f'follow:{instance.user_id}'])
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.follower_removed(instance.author_id)
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    _purge_profiles(instance)
+
+
+def _purge_profiles(follow):
+    # Страницы профилей показывают число подписчиков и подписок.
+    page_cache.purge_paths(
+        reverse('posts:profile', args=[user.username])
+        for user in (follow.author, follow.user)
+    )
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(
+    r'^(.*/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$'
+)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """posts/photo.JPG -> posts/ab/cd/abcd….jpg"""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    )
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.match(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 содержимого.
+
+    Файлы раскладываются по двум уровням каталогов из первых символов
+    хеша, чтобы в одном каталоге не копились сотни тысяч файлов.
+    Повторная загрузка того же файла не создаёт копию: возвращается имя
+    уже сохранённого. Ссылки постов на файлы считает posts.media.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_hash(content))
+        if not self.exists(name):
+            try:
+                return self._save(name, content)
+            except FileExistsError:
+                # Тот же файл одновременно сохранил другой запрос.
+                pass
+        # Свежее время изменения не даст collect_media удалить файл,
+        # пока пост с этим именем ещё не сохранён.
+        os.utime(self.path(name))
+        return name
+
+    def save_derived(self, name, content, max_length=None):
+        """Сохраняет производный файл (вариант srcset) под именем name.
+
+        Имя строится из имени оригинала, в котором уже есть хеш:
+        posts.media находит такие файлы рядом с оригиналом по префиксу.
+        """
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        """Имя из хеша не получает суффикс.
+
+        Файл с таким именем уже хранит те же байты: вместо копии с
+        суффиксом _save пробрасывает FileExistsError, и save возвращает
+        это имя.
+        """
+        if is_hashed_name(name) and self.exists(name):
+            raise FileExistsError(name)
+        return super().get_available_name(name, max_length)
+
+
+post_image_storage = ContentAddressedStorage()
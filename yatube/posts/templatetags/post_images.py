@@ -0,0 +1,48 @@
+from django import template
+from django.conf import settings
+
+from .. import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, geometry='card'):
+    thumbnails.prefetch_thumbnails(posts, geometry)
+    return ''
+
+
+@register.simple_tag
+def post_thumbnail(post, geometry='card'):
+    prefetched = getattr(post, 'thumbnails', {})
+    if geometry in prefetched:
+        return prefetched[geometry]
+    return thumbnails.get_thumbnail(post.image, geometry)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """<picture> с srcset по Post.image_variants, без обращений к диску."""
+    metadata = variants.load(post.image_variants)
+    if not metadata:
+        return {'picture': None}
+    storage = post.image.storage
+    sources = [
+        {
+            'type': mime_type,
+            'srcset': ', '.join(
+                f'{storage.url(name)} {width}w' for name, width in candidates
+            ),
+            'src': storage.url(candidates[-1][0]),
+        }
+        for mime_type, candidates in metadata['sources'].items()
+    ]
+    return {
+        'picture': {
+            'sources': sources[:-1],
+            'img': sources[-1],
+            'width': metadata['width'],
+            'height': metadata['height'],
+            'sizes': settings.IMAGE_VARIANT_SIZES,
+        }
+    }
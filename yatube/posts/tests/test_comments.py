@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPaginationTests(TestCase):
+    """Комментарии под постом выводятся страницами по курсору"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for number in range(7):
+            commenter = User.objects.create_user(username=f'Читатель{number}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {number}'
+            )
+        cls.url = reverse('posts:post_detail', args=[cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_first_page_then_fragments(self):
+        response = self.client.get(self.url)
+        page = response.context['comments']
+        self.assertEqual(self.texts(page), [
+            'Комментарий 6', 'Комментарий 5', 'Комментарий 4'
+        ])
+        seen = self.texts(page)
+        while page.has_next():
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'after': page.next_cursor()}
+            )
+            page = response.context['comments']
+            seen += self.texts(page)
+        self.assertEqual(seen, [f'Комментарий {n}' for n in range(6, -1, -1)])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_no_query_per_comment(self):
+        self.client.get(self.url)
+        cursor = self.client.get(self.url).context['comments'].next_cursor()
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        # Пост и страница комментариев.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'after': cursor})
+        self.assertContains(response, 'Читатель3')
+
+    def test_unknown_post_is_404(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_first_page_cached_until_new_comment(self):
+        self.client.get(self.url)
+        # Только проверка, что пост есть: страница берётся из кеша.
+        with self.assertNumQueries(1):
+            self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk])
+            )
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Свежий комментарий'}
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.context['comments'][0].text, 'Свежий комментарий'
+        )
@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Котики',
+            slug='cat',
+            description='Группа о котиках',
+        )
+        cls.other_group = Group.objects.create(
+            title='Собачки',
+            slug='dog',
+            description='Группа о собачках',
+        )
+
+    def assertCounters(self, user, **expected):
+        counters = UserCounter.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(counters, field), value)
+
+    def test_post_counters(self):
+        """Посты учитываются у автора и группы, в том числе при переносе"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.assertCounters(self.author, posts_count=1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        post.delete()
+        self.assertCounters(self.author, posts_count=0)
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCounters(self.author, followers_count=1)
+        self.assertCounters(self.reader, following_count=1)
+        follow.delete()
+        self.assertCounters(self.author, followers_count=0)
+        self.assertCounters(self.reader, following_count=0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount восстанавливает счётчики по данным"""
+        Post.objects.bulk_create([
+            Post(text='Пост', author=self.author, group=self.group)
+        ] * 3)
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        call_command('recount', stdout=StringIO())
+        self.assertCounters(
+            self.author, posts_count=3, followers_count=1, following_count=0
+        )
+        self.assertCounters(self.reader, following_count=1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+
+    def test_profile_shows_counter(self):
+        Post.objects.create(text='Пост', author=self.author)
+        response = Client().get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.context['counters'].posts_count, 1)
+        self.assertContains(response, 'Всего постов: 1')
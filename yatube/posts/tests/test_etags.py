@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    """Неизменившиеся страницы отвечают 304 без рендеринга"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts', args=[cls.group.slug]),
+            'profile': reverse('posts:profile', args=[cls.author.username]),
+            'post': reverse('posts:post_detail', args=[cls.post.pk]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_pages_not_modified(self):
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                etag = self.etag(url)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_new_post_changes_feeds(self):
+        etags = {name: self.etag(url) for name, url in self.urls.items()}
+        Post.objects.create(text='Новый', author=self.author, group=self.group)
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertNotEqual(self.etag(self.urls[name]), etags[name])
+
+    def test_comment_changes_post_page(self):
+        etag = self.etag(self.urls['post'])
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertNotEqual(self.etag(self.urls['post']), etag)
+
+    def test_follow_changes_profile(self):
+        etag = self.etag(self.urls['profile'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertNotEqual(self.etag(self.urls['profile']), etag)
+
+    def test_etag_depends_on_reader(self):
+        anonymous = Client().get(self.urls['index'])['ETag']
+        self.assertNotEqual(self.etag(self.urls['index']), anonymous)
+
+    def test_missing_objects_still_404(self):
+        response = self.client.get(
+            reverse('posts:group_posts', args=['missing'])
+        )
+        self.assertEqual(response.status_code, 404)
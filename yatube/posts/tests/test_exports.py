@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .. import exports
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    """Выгрузка постов, комментариев и подписок идёт потоком"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.admin = User.objects.create_user(
+            username='Админ', is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author,
+                group=cls.group if number % 2 else None
+            )
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.author, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.author, author=cls.reader)
+
+    def read_jsonl(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_keyset_rows_cover_all_chunks(self):
+        rows = list(exports.keyset_rows(Post.objects.all(), ('text',)))
+        self.assertEqual([pk for pk, _ in rows],
+                         sorted(post.pk for post in self.posts))
+
+    def test_author_export(self):
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(
+            reverse('posts:profile_export', args=[self.author.username])
+        )
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = self.read_jsonl(response)
+        types = [row['type'] for row in rows]
+        self.assertEqual(types, ['post'] * 5 + ['comment', 'follow'])
+        self.assertEqual(rows[-1]['following'], self.reader.username)
+
+    def test_group_export_csv(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('posts:group_export', args=[self.group.slug]),
+            {'format': 'csv'}
+        )
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(
+            [row['type'] for row in rows], ['post', 'post', 'comment']
+        )
+        self.assertEqual(rows[0]['group'], self.group.slug)
+
+    def test_export_forbidden_for_others(self):
+        client = Client()
+        client.force_login(self.reader)
+        for url in (
+            reverse('posts:profile_export', args=[self.author.username]),
+            reverse('posts:group_export', args=[self.group.slug]),
+        ):
+            self.assertEqual(client.get(url).status_code, 403)
+
+    def test_command_output_imports_back(self):
+        path = os.path.join(tempfile.mkdtemp(), 'export.jsonl')
+        call_command(
+            'export_posts', '--author', self.author.username,
+            '--output', path, stdout=StringIO()
+        )
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {number}' for number in range(5)]
+        )
@@ -0,0 +1,105 @@
+import base64
+import io
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+
+User = get_user_model()
+
+
+def uploaded_jpeg(name, size, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+def decode(placeholder):
+    prefix = 'data:image/jpeg;base64,'
+    assert placeholder.startswith(prefix)
+    return Image.open(io.BytesIO(base64.b64decode(placeholder[len(prefix):])))
+
+
+@override_settings(
+    THUMBNAIL_WORKERS=0,
+    IMAGE_PLACEHOLDER_SIZE=16,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+)
+class ImagePlaceholderTests(TestCase):
+    """Размытая заглушка считается при сохранении поста"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_built_on_create(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_jpeg('wide.jpg', (800, 400), (250, 10, 10))
+        )
+        image = decode(post.image_placeholder)
+        self.assertEqual(image.size, (16, 8))
+        red, green, blue = image.getpixel((8, 4))
+        self.assertGreater(red, 200)
+        self.assertLess(green, 60)
+        self.assertLess(len(post.image_placeholder), 1500)
+
+    def test_placeholder_follows_image(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_jpeg('a.jpg', (40, 40), (10, 10, 250))
+        )
+        old = post.image_placeholder
+        post.image = uploaded_jpeg('b.jpg', (40, 40), (10, 250, 10))
+        post.save()
+        self.assertNotEqual(post.image_placeholder, old)
+        post.image = None
+        post.save()
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_unreadable_image_has_no_placeholder(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, image='posts/missing.jpg'
+        )
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_backfill_command(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_jpeg('c.jpg', (40, 40), (120, 120, 0))
+        )
+        Post.objects.filter(pk=post.pk).update(image_placeholder='')
+        call_command('backfill_placeholders', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(decode(post.image_placeholder).size, (16, 16))
+
+    def test_feed_inlines_placeholder(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_jpeg('d.jpg', (40, 40), (0, 120, 120))
+        )
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, post.image_placeholder)
+        self.assertContains(response, 'loading="lazy"')
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import caching
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTests(TestCase):
+    """Карточка поста кешируется один раз для всех лент"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='Автор', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Старый текст', author=self.author, group=self.group
+        )
+        self.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=['group']),
+            reverse('posts:profile', args=['Автор']),
+        ]
+
+    def sneak_text(self, text):
+        """Меняет текст в базе мимо save(): Post.updated остаётся прежним."""
+        Post.objects.filter(pk=self.post.pk).update(text=text)
+        # Сбрасывает фрагменты лент, но не карточки.
+        caching.bump_versions([caching.GROUPS_SCOPE])
+
+    def test_card_is_shared_between_feeds(self):
+        Client().get(self.pages[0])
+        self.sneak_text('Подменённый текст')
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertContains(response, 'Старый текст')
+                self.assertNotContains(response, 'Подменённый текст')
+
+    def test_edit_invalidates_card(self):
+        Client().get(self.pages[0])
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in self.pages:
+            with self.subTest(url=url):
+                self.assertContains(Client().get(url), 'Новый текст')
+
+    def test_author_and_group_changes_invalidate_card(self):
+        Client().get(self.pages[0])
+        self.group.title = 'Переименованная'
+        self.group.save()
+        self.assertContains(Client().get(self.pages[0]), 'Переименованная')
+        self.author.first_name = 'Алексей'
+        self.author.save()
+        caching.bump_versions([caching.GROUPS_SCOPE])
+        self.assertContains(Client().get(self.pages[0]), 'Алексей Толстой')
+
+    def test_save_moves_updated_stamp(self):
+        stamp = self.post.updated
+        self.post.save()
+        self.assertGreater(self.post.updated, stamp)
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.queries import get_query_budget, record_queries
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    """Страницы укладываются в объявленный query_budget и не дают N+1"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Котики',
+            slug='cat',
+            description='Группа о котиках',
+        )
+        for i in range(settings.POSTS_PER_PAGE + 2):
+            author = User.objects.create_user(username=f'Автор {i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Описание',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                text=f'Пост {i}', author=author, group=group
+            )
+            Post.objects.create(
+                text=f'Пост в котиках {i}', author=author, group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text=f'Комментарий {i}'
+            )
+        for i in range(settings.COMMENTS_PER_PAGE):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Ответ {i}'
+            )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryBudgetTests.reader)
+
+    def assertWithinBudget(self, client, url, cached=True):
+        """Холодный и повторный запрос укладываются в бюджет.
+
+        cached - кешируется ли вывод страницы: тогда повторный запрос
+        дешевле холодного, иначе стоит столько же.
+        """
+        cache.clear()
+        with record_queries() as cold:
+            response = client.get(url)
+        with record_queries() as warm:
+            client.get(url)
+        self.assertEqual(response.status_code, 200)
+        budget = get_query_budget(response.resolver_match.func)
+        self.assertIsNotNone(budget, f'{url}: не объявлен query_budget')
+        for log in (cold, warm):
+            self.assertLessEqual(
+                len(log), budget, f'{url}: превышен бюджет запросов'
+            )
+            self.assertEqual(
+                log.repeated(settings.QUERY_INSPECTOR_REPEAT_THRESHOLD), {},
+                f'{url}: повторяющиеся запросы'
+            )
+        if cached:
+            self.assertLess(len(warm), len(cold), f'{url}: нет попадания')
+        else:
+            self.assertEqual(len(warm), len(cold), url)
+
+    def test_public_pages_within_budget(self):
+        index = reverse('posts:index')
+        first_page = self.reader_client.get(index).context['page_obj']
+        second_page = self.reader_client.get(
+            index, {'after': first_page.next_cursor()}
+        ).context['page_obj']
+        comments = self.reader_client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        urls = {
+            index: True,
+            index + '?page=2': True,
+            # Страницы по курсору выбираются во view, до фрагмента.
+            index + '?after=' + first_page.next_cursor(): False,
+            index + '?before=' + second_page.previous_cursor(): False,
+            reverse('posts:group_posts', args=[self.group.slug]): True,
+            reverse('posts:profile', args=[self.post.author.username]): True,
+            reverse('posts:post_detail', args=[self.post.pk]): True,
+            reverse('posts:post_comments', args=[self.post.pk]): True,
+            # Кешируется только первая страница комментариев.
+            reverse('posts:post_comments', args=[self.post.pk]) + (
+                '?after=' + comments.next_cursor()
+            ): False,
+            reverse('posts:search') + '?q=Пост': False,
+        }
+        for url, cached in urls.items():
+            for client in (Client(), self.reader_client):
+                with self.subTest(url=url):
+                    self.assertWithinBudget(client, url, cached)
+
+    def test_follow_index_within_budget(self):
+        self.assertWithinBudget(
+            self.reader_client, reverse('posts:follow_index')
+        )
@@ -0,0 +1,91 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from ..search import FTS_TABLE
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.cat_post = Post.objects.create(
+            text='Котики любят спать на солнце',
+            author=cls.author,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собаки любят гулять. Котики не любят собак',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_search_finds_by_words_and_prefix(self):
+        """Поиск находит посты по словам и началам слов"""
+        self.assertEqual(list(self.search('солнце')), [self.cat_post])
+        self.assertEqual(list(self.search('собак')), [self.dog_post])
+        self.assertEqual(
+            set(self.search('котики любят')), {self.cat_post, self.dog_post}
+        )
+        self.assertEqual(list(self.search('"; DROP TABLE')), [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        post = Post.objects.create(
+            text='<script>alert(1)</script> хомяки', author=self.author
+        )
+        found = self.search('хомяки')[0]
+        self.assertEqual(found, post)
+        self.assertIn('<mark>хомяки</mark>', found.search_snippet)
+        self.assertNotIn('<script>', found.search_snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.cat_post.pk)
+        post.text = 'Котики любят молоко'
+        post.save()
+        self.assertEqual(list(self.search('солнце')), [])
+        self.assertEqual(list(self.search('молоко')), [post])
+        post.delete()
+        self.assertEqual(list(self.search('молоко')), [])
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_keyset_pages_of_results(self):
+        Post.objects.bulk_create(
+            Post(text=f'Попугаи {"попугаи " * i}', author=self.author)
+            for i in range(5)
+        )
+        first_page = self.search('попугаи')
+        seen = list(first_page)
+        page = first_page
+        while page.has_next():
+            page = self.search('попугаи', after=page.next_cursor())
+            seen += list(page)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        ranks = [post.search_rank for post in seen]
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_rebuild_search_index_command(self):
+        for _ in range(2):
+            call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(list(self.search('солнце')), [self.cat_post])
+        with connection.cursor() as cursor:
+            # Ошибка, если в индексе есть дубли или лишние записи.
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) "
+                "VALUES ('integrity-check', 1)"
+            )
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Comment, Follow, Post, StoredFile, TimelineEntry
+
+User = get_user_model()
+
+SIZES = [
+    '--users', '30', '--groups', '3', '--posts', '300', '--follows', '4',
+    '--comments', '200', '--batch-size', '70',
+]
+
+
+def seed(prefix, *args):
+    call_command(
+        'seed_yatube', '--prefix', prefix, *SIZES, *args, stdout=StringIO()
+    )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SeedYatubeTests(TestCase):
+    """seed_yatube создаёт согласованный набор данных по зерну"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def posts_of(self, prefix):
+        return [
+            (
+                author[len(prefix):], text, group and group[len(prefix):],
+                pub_date
+            )
+            for author, text, group, pub_date in Post.objects.filter(
+                author__username__startswith=prefix
+            ).order_by('pk').values_list(
+                'author__username', 'text', 'group__slug', 'pub_date'
+            )
+        ]
+
+    def test_same_seed_gives_same_data(self):
+        seed('a', '--seed', '7')
+        seed('b', '--seed', '7')
+        seed('c', '--seed', '8')
+        self.assertEqual(self.posts_of('a'), self.posts_of('b'))
+        self.assertNotEqual(self.posts_of('a'), self.posts_of('c'))
+
+    def test_authors_follow_power_law(self):
+        seed('seed')
+        counts = sorted(
+            (user.counters.posts_count for user in User.objects.all()),
+            reverse=True
+        )
+        self.assertEqual(sum(counts), 300)
+        self.assertGreater(counts[0], 5 * counts[len(counts) // 2])
+
+    def test_derived_data_is_consistent(self):
+        seed('seed')
+        for user in User.objects.select_related('counters'):
+            self.assertEqual(
+                user.counters.posts_count, user.posts.count()
+            )
+            self.assertEqual(
+                user.counters.followers_count, user.following.count()
+            )
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comments_count'))['total'],
+            Comment.objects.count()
+        )
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=follow.user, post__author=follow.author
+            ).count(),
+            follow.author.posts.count()
+        )
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+
+    def test_images_are_shared_between_posts(self):
+        seed('seed', '--images', '2', '--image-ratio', '1')
+        self.assertFalse(Post.objects.filter(image='').exists())
+        self.assertFalse(Post.objects.filter(image_placeholder='').exists())
+        self.assertEqual(StoredFile.objects.count(), 2)
+        self.assertEqual(
+            StoredFile.objects.aggregate(total=Sum('references'))['total'],
+            300
+        )
+
+    def test_existing_prefix_is_refused(self):
+        seed('seed')
+        with self.assertRaises(CommandError):
+            seed('seed')
+
+    def test_epoch_bounds_post_dates(self):
+        seed('seed', '--start', '2021-01-01', '--epoch', '2021-02-01')
+        dates = [
+            timezone.localtime(pub_date).date()
+            for pub_date in Post.objects.values_list('pub_date', flat=True)
+        ]
+        self.assertGreaterEqual(min(dates), date(2021, 1, 1))
+        self.assertLess(max(dates), date(2021, 2, 1))
+        with self.assertRaises(CommandError):
+            seed('late', '--start', '2021-02-01', '--epoch', '2021-01-01')
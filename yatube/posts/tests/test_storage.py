@@ -0,0 +1,226 @@
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from .. import media, thumbnails
+from ..models import Post, StoredFile
+from ..storage import is_hashed_name, post_image_storage
+
+User = get_user_model()
+
+
+def png_bytes(color):
+    buffer = BytesIO()
+    Image.new('RGB', (20, 20), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def uploaded_png(name, color=(10, 20, 30)):
+    return SimpleUploadedFile(name, png_bytes(color), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+    """Картинки хранятся под хешем содержимого без дублей"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_same_content_stored_once(self):
+        first = Post.objects.create(
+            text='Первый', author=self.author, image=uploaded_png('a.PNG')
+        )
+        second = Post.objects.create(
+            text='Второй', author=self.author, image=uploaded_png('b.png')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed_name(first.image.name))
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]+\.png$'
+        )
+        self.assertTrue(post_image_storage.exists(first.image.name))
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).references, 2
+        )
+
+    def test_concurrent_save_returns_hashed_name(self):
+        """Файл, сохранённый другим запросом между проверкой и записью"""
+        content = ContentFile(png_bytes((7, 8, 9)), name='race.png')
+        name = post_image_storage.save('posts/race.png', content)
+        # Первая проверка в save не видит файла, как при гонке запросов.
+        exists = post_image_storage.exists
+        with mock.patch.object(
+            post_image_storage, 'exists', side_effect=[False, True, True]
+        ):
+            self.assertEqual(
+                post_image_storage.save('posts/race.png', content), name
+            )
+        self.assertTrue(exists(name))
+        directory = os.path.dirname(post_image_storage.path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+
+    def test_edit_moves_reference(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_png('old.png', (1, 2, 3))
+        )
+        old_name = post.image.name
+        post.image = uploaded_png('new.png', (4, 5, 6))
+        post.save()
+        self.assertEqual(StoredFile.objects.get(name=old_name).references, 0)
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).references, 1
+        )
+
+    def test_recount_restores_references(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=uploaded_png('r.png')
+        )
+        StoredFile.objects.all().delete()
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).references, 1
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StoredFileCollectionTests(TransactionTestCase):
+    """Файл удаляется после коммита, когда на него не осталось ссылок"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Фотограф')
+
+    def test_file_deleted_with_last_reference(self):
+        first = Post.objects.create(
+            text='Первый', author=self.author,
+            image=uploaded_png('c.png', (7, 7, 7))
+        )
+        second = Post.objects.create(
+            text='Второй', author=self.author,
+            image=uploaded_png('d.png', (7, 7, 7))
+        )
+        name = first.image.name
+        first.delete()
+        self.assertTrue(post_image_storage.exists(name))
+        second.delete()
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_migrate_media_storage_moves_legacy_files(self):
+        legacy_name = post_image_storage._save(
+            'posts/legacy.png', ContentFile(png_bytes((9, 9, 9)))
+        )
+        post = Post.objects.create(
+            text='Старый пост', author=self.author, image=legacy_name
+        )
+        call_command('migrate_media_storage', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(is_hashed_name(post.image.name))
+        self.assertTrue(post_image_storage.exists(post.image.name))
+        self.assertFalse(post_image_storage.exists(legacy_name))
+        self.assertFalse(StoredFile.objects.filter(name=legacy_name).exists())
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).references, 1
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class CollectMediaTests(TestCase):
+    """collect_media убирает файлы, на которые не ссылаются посты"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.orphan = self.create_post((101, 102, 103))
+        orphan_thumbnails = set(media.kvstore_names(True))
+        self.kept = self.create_post((104, 105, 106))
+        self.kept_thumbnails = (
+            set(media.kvstore_names(True)) - orphan_thumbnails
+        )
+        self.orphan_thumbnails = orphan_thumbnails
+        # update() обходит сигналы: так файлы и оставались после правок.
+        Post.objects.filter(image=self.orphan).update(image='')
+
+    def create_post(self, color):
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=uploaded_png('gc.png', color)
+        )
+        thumbnails.generate(post.image.name)
+        old = time.time() - 60 * 60 * 48
+        os.utime(post_image_storage.path(post.image.name), (old, old))
+        return post.image.name
+
+    def test_sorted_names_merges_runs(self):
+        names = ['d', 'b', 'a', 'c', 'b', 'e']
+        self.assertEqual(
+            list(media.sorted_names(names, buffer_size=2)),
+            ['a', 'b', 'c', 'd', 'e']
+        )
+
+    def test_dry_run_keeps_files(self):
+        out = StringIO()
+        call_command('collect_media', '--dry-run', stdout=out)
+        self.assertIn(self.orphan, out.getvalue())
+        self.assertTrue(post_image_storage.exists(self.orphan))
+        for name in self.orphan_thumbnails:
+            self.assertTrue(post_image_storage.exists(name))
+
+    def test_orphans_deleted(self):
+        call_command('collect_media', stdout=StringIO())
+        self.assertFalse(post_image_storage.exists(self.orphan))
+        self.assertFalse(StoredFile.objects.filter(name=self.orphan).exists())
+        self.assertTrue(self.orphan_thumbnails)
+        for name in self.orphan_thumbnails:
+            self.assertFalse(post_image_storage.exists(name))
+        self.assertTrue(post_image_storage.exists(self.kept))
+        for name in self.kept_thumbnails:
+            self.assertTrue(post_image_storage.exists(name))
+
+    def test_young_files_kept(self):
+        os.utime(post_image_storage.path(self.orphan))
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(post_image_storage.exists(self.orphan))
+
+    def test_quarantine_moves_files(self):
+        quarantine = tempfile.mkdtemp()
+        call_command(
+            'collect_media', '--quarantine', quarantine, stdout=StringIO()
+        )
+        self.assertFalse(post_image_storage.exists(self.orphan))
+        self.assertTrue(
+            os.path.exists(os.path.join(quarantine, self.orphan))
+        )
@@ -0,0 +1,289 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.queries import record_queries
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def uploaded_gif(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+def uploaded_png(name, color):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 20), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/png'
+    )
+
+
+@override_settings(THUMBNAIL_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailPlaceholderTests(TestCase):
+    """Пока миниатюры нет, страница показывает заглушку"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=uploaded_gif(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_while_queued(self):
+        post = Post.objects.get(pk=self.post.pk)
+        cache.set(thumbnails.pending_key(post.image.name), True)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '/media/cache/')
+
+        cache.delete(thumbnails.pending_key(post.image.name))
+        thumbnails.submit(post.image.name)
+        self.assertIsNotNone(
+            thumbnails.backend.get_cached_thumbnail(
+                post.image, '960x339', crop='center', upscale=True
+            )
+        )
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'srcset=')
+        self.assertNotContains(response, 'aspect-ratio')
+
+    def test_not_queued_image_is_resized_in_request(self):
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnail = thumbnails.get_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(
+            Client().get(reverse('posts:post_detail', args=[post.pk])),
+            thumbnail.url
+        )
+
+    def test_post_without_image_has_no_placeholder(self):
+        Post.objects.create(text='Без картинки', author=self.author)
+        self.assertIsNone(thumbnails.get_thumbnail(None, 'card'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailPrefetchTests(TestCase):
+    """Миниатюры страницы находятся одним запросом к KVStore"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author,
+                image=uploaded_png(f'prefetch-{i}.png', (i * 80, 0, 0)),
+            )
+            thumbnails.generate(post.image.name)
+        Post.objects.create(text='Без картинки', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefetch_matches_single_lookups(self):
+        posts = list(Post.objects.all())
+        # У каждого поста свой файл: одинаковые байты хранятся одним.
+        self.assertEqual(
+            len({post.image.name for post in posts if post.image}), 3
+        )
+        with record_queries() as log:
+            thumbnails.prefetch_thumbnails(posts)
+        self.assertEqual(len(log), 1)
+        for post in posts:
+            with self.subTest(post=post.text):
+                expected = thumbnails.get_thumbnail(post.image, 'card')
+                self.assertEqual(
+                    getattr(post.thumbnails['card'], 'name', None),
+                    getattr(expected, 'name', None)
+                )
+
+    def test_prefetch_uses_cache_on_second_page_render(self):
+        thumbnails.prefetch_thumbnails(list(Post.objects.all()))
+        posts = list(Post.objects.all())
+        with record_queries() as log:
+            thumbnails.prefetch_thumbnails(posts)
+        self.assertEqual(len(log), 0)
+        self.assertEqual(
+            sum(post.thumbnails['card'] is not None for post in posts), 3
+        )
+
+
+@override_settings(THUMBNAIL_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailQueueTests(TransactionTestCase):
+    """Создание и правка поста ставят миниатюры в очередь после коммита"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Фотограф')
+        self.client.force_login(self.author)
+
+    def assertThumbnailReady(self, post):
+        self.assertIsNotNone(
+            thumbnails.backend.get_cached_thumbnail(
+                post.image, '960x339', crop='center', upscale=True
+            )
+        )
+
+    def test_post_create_queues_thumbnails(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'image': uploaded_png('new.png', 'green')}
+        )
+        self.assertThumbnailReady(Post.objects.get(text='Новый пост'))
+
+    def test_post_edit_queues_thumbnails(self):
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Старый пост',
+             'image': uploaded_png('edited.png', 'blue')}
+        )
+        post.refresh_from_db()
+        self.assertThumbnailReady(post)
+
+
+@override_settings(THUMBNAIL_WORKERS=2, MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailWorkersTests(TransactionTestCase):
+    """С THUMBNAIL_WORKERS миниатюры создаются в пуле потоков"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._executor = None
+        self.author = User.objects.create_user(username='Фотограф')
+        self.client.force_login(self.author)
+
+    def tearDown(self):
+        thumbnails._executor = None
+
+    def test_post_create_generates_in_worker_thread(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'image': uploaded_png('pool.png', 'red')}
+        )
+        executor = thumbnails._executor
+        self.assertIsNotNone(executor)
+        executor.shutdown(wait=True)
+        post = Post.objects.get(text='Новый пост')
+        self.assertIsNotNone(
+            thumbnails.backend.get_cached_thumbnail(
+                post.image, '960x339', crop='center', upscale=True
+            )
+        )
+        self.assertTrue(post.image_variants)
+        self.assertIsNone(cache.get(thumbnails.pending_key(post.image.name)))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RebuildThumbnailsCommandTests(TestCase):
+    """rebuild_thumbnails продолжает работу с сохранённого места"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author,
+                image=uploaded_png(f'rebuild-{i}.png', (i, i, i)),
+            )
+            for i in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+
+    def rebuild(self, *args):
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails', '--workers=0', '--batch-size=2',
+            f'--checkpoint={self.checkpoint}', *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_resume_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'last_id': self.posts[0].pk, 'done': 1}, file)
+        output = self.rebuild()
+        self.assertIn('Готово: 3 картинок, ошибок: 0', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        skipped, *rebuilt = Post.objects.filter(
+            pk__in=[post.pk for post in self.posts]
+        ).order_by('pk')
+        self.assertEqual(skipped.image_variants, '')
+        for post in rebuilt:
+            self.assertTrue(post.image_variants)
+            self.assertIsNotNone(
+                thumbnails.backend.get_cached_thumbnail(
+                    post.image, '960x339', crop='center', upscale=True
+                )
+            )
+
+    def test_restart_ignores_checkpoint(self):
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'last_id': self.posts[-1].pk, 'done': 3}, file)
+        self.rebuild('--restart')
+        self.assertFalse(
+            Post.objects.filter(
+                pk__in=[post.pk for post in self.posts], image_variants=''
+            ).exists()
+        )
@@ -0,0 +1,216 @@
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import author_timelines, timeline
+from ..models import Follow, Post, TimelineEntry
+from ..paginators import encode_cursor
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTests.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def feed_posts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed_posts(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дозаполняет ленту, отписка чистит её"""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(),
+            len(posts)
+        )
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed_posts(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора не раскладываются, но видны в ленте"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text='Популярный пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_posts(), [post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_unfollow_below_threshold_fans_out_pulled_posts(self):
+        """Посты, написанные пока автора подмешивали, остаются в ленте"""
+        other = User.objects.create_user(username='Другой читатель')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text='Популярный пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        follow.delete()
+        self.assertNotIn(self.author.pk, timeline.pulled_author_ids())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed_posts(), [post])
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command(
+            'rebuild_timelines', self.reader.username, stdout=StringIO()
+        )
+        self.assertEqual(self.feed_posts(), [post])
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_feed_pages_by_entry_pub_date(self):
+        """Лента сортируется и листается по дате из TimelineEntry"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        now = timezone.now()
+        posts = []
+        for days in (1, 3, 2):
+            post = Post.objects.create(text='Пост', author=self.author)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(days=days)
+            )
+            posts.append(post)
+        TimelineEntry.objects.all().delete()
+        timeline.rebuild([self.reader.pk])
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(
+                TimelineEntry.objects.get(post=post).pub_date, post.pub_date
+            )
+        first_page = self.reader_client.get(
+            reverse('posts:follow_index')
+        ).context['page_obj']
+        self.assertEqual(list(first_page), [posts[0], posts[2]])
+        second_page = self.reader_client.get(
+            reverse('posts:follow_index'),
+            {'after': first_page.next_cursor()}
+        ).context['page_obj']
+        self.assertEqual(list(second_page), [posts[1]])
+
+    def test_migration_fills_timelines(self):
+        """Миграция 0015 раскладывает посты, написанные до 0009"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        TimelineEntry.objects.exclude(post=posts[0]).delete()
+        migration = import_module('posts.migrations.0015_timeline_pub_date')
+        migration.fill_timelines(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(
+            sorted(TimelineEntry.objects.values_list('post_id', 'pub_date')),
+            [(post.pk, post.pub_date) for post in posts]
+        )
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge', POSTS_PER_PAGE=3)
+class MergeFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.authors = [
+            User.objects.create_user(username=f'Автор {i}') for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(MergeFeedTests.reader)
+        self.posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i in range(2)
+            for author in self.authors
+        ]
+        self.posts.reverse()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_page(self, query=''):
+        response = self.reader_client.get(
+            reverse('posts:follow_index') + query
+        )
+        return response.context['page_obj']
+
+    def test_merge_feed_matches_join_order(self):
+        """Слияние лент авторов выдаёт посты в порядке публикации"""
+        first_page = self.get_page()
+        second_page = self.get_page('?after=' + first_page.next_cursor())
+        self.assertEqual(
+            list(first_page) + list(second_page), self.posts
+        )
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(list(self.get_page('?page=2')), self.posts[3:])
+        back_page = self.get_page('?before=' + second_page.previous_cursor())
+        self.assertEqual(list(back_page), self.posts[:3])
+
+    def test_naive_cursor_falls_back_to_first_page(self):
+        """Курсор с датой без пояса не доходит до слияния лент"""
+        cursor = encode_cursor('2021-01-01T00:00:00', self.posts[0].pk)
+        self.assertEqual(list(self.get_page('?after=' + cursor)),
+                         self.posts[:3])
+
+    def test_merge_normalizes_cursor(self):
+        """Слияние принимает курсор с наивной датой и id строкой"""
+        timelines = author_timelines.get_author_timelines(
+            author.pk for author in self.authors
+        )
+        post = self.posts[2]
+        cursor = (timezone.make_naive(post.pub_date), str(post.pk))
+        after = [pk for _, pk in author_timelines.merge_after(
+            timelines, cursor
+        )]
+        before = [pk for _, pk in author_timelines.merge_before(
+            timelines, cursor
+        )]
+        posts = [post.pk for post in self.posts]
+        self.assertEqual(after, posts[3:])
+        self.assertEqual(before, posts[:2][::-1])
+
+    def test_author_timeline_refreshed_on_delete(self):
+        self.get_page()
+        self.posts[0].delete()
+        self.assertEqual(list(self.get_page()), self.posts[1:4])
@@ -0,0 +1,176 @@
+import io
+import shutil
+import struct
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile)
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image, JpegImagePlugin, TiffImagePlugin, TiffTags
+
+from ..forms import PostForm
+from ..models import Post
+from ..uploads import ORIENTATION_TAG, pixels_error, size_error
+
+User = get_user_model()
+
+
+def image_bytes(size, image_format='PNG', noise=False, exif=None):
+    if noise:
+        image = Image.effect_noise(size, 100).convert('RGB')
+    else:
+        image = Image.new('RGB', size, (40, 120, 200))
+    buffer = io.BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def mpo_bytes(size):
+    """Снимок MPO из двух кадров: Pillow умеет MPO только читать."""
+    first, second = image_bytes(size, 'JPEG'), image_bytes(size, 'JPEG')
+
+    def mpf_segment(first_size):
+        mp_index = TiffImagePlugin.ImageFileDirectory_v2(prefix=b'II')
+        mp_index[0xB000] = b'0100'
+        mp_index.tagtype[0xB000] = TiffTags.UNDEFINED
+        mp_index[0xB001] = 2
+        # Смещение второго кадра считается от заголовка TIFF: 10 байт.
+        mp_index[0xB002] = (
+            struct.pack('<LLLHH', 0x20030000, first_size, 0, 0, 0)
+            + struct.pack('<LLLHH', 0, len(second), first_size - 10, 0, 0)
+        )
+        mp_index.tagtype[0xB002] = TiffTags.UNDEFINED
+        data = b'MPF\0II*\0\x08\0\0\0' + mp_index.tobytes(8)
+        return b'\xff\xe2' + struct.pack('>H', len(data) + 2) + data
+
+    first_size = len(first) + len(mpf_segment(10))
+    return first[:2] + mpf_segment(first_size) + first[2:] + second
+
+
+def temporary_upload(name, content, content_type):
+    upload = TemporaryUploadedFile(name, content_type, len(content), None)
+    upload.write(content)
+    upload.seek(0)
+    return upload
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PostFormImageTests(TestCase):
+    """PostForm проверяет и уменьшает картинки, не читая их в память"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_large_jpeg_is_decoded_reduced(self):
+        """Большой JPEG декодируется сразу уменьшенным (draft)"""
+        exif = Image.Exif()
+        exif[ORIENTATION_TAG] = 6
+        content = image_bytes(
+            (2400, 1600), 'JPEG', noise=True, exif=exif.tobytes()
+        )
+        upload = temporary_upload('big.jpg', content, 'image/jpeg')
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        decoded_sizes = []
+        load = JpegImagePlugin.JpegImageFile.load
+
+        def spy_load(image):
+            decoded_sizes.append(image.size)
+            return load(image)
+
+        with override_settings(IMAGE_UPLOAD_MAX_SIDE=400), mock.patch.object(
+            JpegImagePlugin.JpegImageFile, 'load', spy_load
+        ):
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(decoded_sizes[0], (1200, 800))
+        with Image.open(form.cleaned_data['image']) as image:
+            # Поворот из EXIF применён, сами метаданные убраны.
+            self.assertEqual(image.size, (267, 400))
+            self.assertNotIn('exif', image.info)
+
+    def test_mpo_saved_as_jpeg(self):
+        """Снимок MPO пересохраняется в JPEG из первого кадра"""
+        content = mpo_bytes((300, 200))
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual((image.format, image.n_frames), ('MPO', 2))
+        upload = temporary_upload('photo.mpo', content, 'image/jpeg')
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        saved = form.cleaned_data['image']
+        self.assertEqual(saved.name, 'photo.jpg')
+        with Image.open(saved) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (300, 200))
+
+    def test_too_many_pixels_rejected(self):
+        upload = SimpleUploadedFile(
+            'wide.png', image_bytes((200, 100)), content_type='image/png'
+        )
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=10_000):
+            self.assertFalse(form.is_valid())
+        self.assertIn('Картинка слишком большая', form.errors['image'][0])
+
+    def test_clean_image_kept_as_is(self):
+        upload = SimpleUploadedFile(
+            'plain.png', image_bytes((50, 50)), content_type='image/png'
+        )
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageUploadHandlerTests(TestCase):
+    """Лимиты загрузки проверяются по ходу чтения запроса"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Загрузчик')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def post_image(self, name, content):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(name, content, 'image/png'),
+            }
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_oversized_upload_rejected(self):
+        response = self.post_image(
+            'noise.png', image_bytes((100, 100), noise=True)
+        )
+        self.assertFormError(response, 'form', 'image', size_error())
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10_000)
+    def test_header_pixel_count_rejected(self):
+        response = self.post_image('wide.png', image_bytes((200, 100)))
+        self.assertFormError(response, 'form', 'image', pixels_error())
+        self.assertFalse(Post.objects.exists())
+
+    def test_upload_streamed_to_temporary_file(self):
+        response = self.post_image('plain.png', image_bytes((50, 50)))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            Post.objects.filter(image__startswith='posts/').exists()
+        )
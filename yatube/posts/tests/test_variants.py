@@ -0,0 +1,139 @@
+import io
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import media, thumbnails, variants
+from ..models import Post, StoredFile
+from ..storage import ContentAddressedStorage, post_image_storage
+
+User = get_user_model()
+
+
+def uploaded_png(name, size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/png'
+    )
+
+
+@override_settings(
+    THUMBNAIL_WORKERS=0,
+    IMAGE_VARIANT_WIDTHS=(320, 640, 960, 1440),
+    IMAGE_VARIANT_RATIO=(960, 339),
+    MEDIA_ROOT=tempfile.mkdtemp(),
+)
+class ImageVariantsTests(TestCase):
+    """Варианты картинки для srcset создаются рядом с оригиналом"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Фотограф')
+        cls.post = Post.objects.create(
+            text='Большая картинка',
+            author=cls.author,
+            image=uploaded_png('wide.png', (1000, 500)),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_variants_next_to_original(self):
+        metadata = variants.build_variants(
+            self.post.image.name, post_image_storage
+        )
+        self.assertEqual(metadata['width'], 960)
+        self.assertEqual(metadata['height'], 339)
+        self.assertIn('image/png', metadata['sources'])
+        for candidates in metadata['sources'].values():
+            self.assertEqual(
+                [width for _, width in candidates], [320, 640, 960]
+            )
+            for name, width in candidates:
+                self.assertTrue(name.startswith('posts/'))
+                with post_image_storage.open(name) as file:
+                    self.assertEqual(
+                        Image.open(file).size,
+                        (width, round(width * 339 / 960))
+                    )
+
+    def test_small_image_gets_single_variant(self):
+        post = Post.objects.create(
+            text='Маленькая картинка',
+            author=self.author,
+            image=uploaded_png('small.png', (200, 100)),
+        )
+        metadata = variants.build_variants(post.image.name, post_image_storage)
+        self.assertEqual(
+            [width for _, width in metadata['sources']['image/png']], [200]
+        )
+
+    def test_variants_follow_image_storage(self):
+        """Варианты пишутся и удаляются в хранилище картинки"""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        storage = ContentAddressedStorage(location=location)
+        name = storage.save(
+            'posts/other.png', uploaded_png('other.png', (700, 350))
+        )
+        metadata = variants.build_variants(name, storage)
+        names = [
+            variant for candidates in metadata['sources'].values()
+            for variant, _ in candidates
+        ]
+        self.assertCountEqual(media.variant_names(name, storage), names)
+        for variant in names:
+            self.assertTrue(storage.exists(variant))
+            self.assertFalse(post_image_storage.exists(variant))
+        StoredFile.objects.create(name=name, references=0)
+        media.collect(name, storage)
+        for variant in [name, *names]:
+            self.assertFalse(storage.exists(variant))
+
+    def test_feed_renders_srcset_from_metadata(self):
+        thumbnails.submit(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        metadata = json.loads(post.image_variants)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(
+            response, f'sizes="{settings.IMAGE_VARIANT_SIZES}"'
+        )
+        for name, width in metadata['sources']['image/png']:
+            self.assertContains(
+                response, f'{post_image_storage.url(name)} {width}w'
+            )
+
+    def test_new_image_resets_variants(self):
+        post = Post.objects.create(
+            text='Пост с вариантами',
+            author=self.author,
+            image=uploaded_png('first.png', (400, 200)),
+        )
+        thumbnails.submit(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.image_variants)
+        post.text = 'Только текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertTrue(post.image_variants)
+        post.image = uploaded_png('second.png', (400, 200))
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '')
@@ -1,15 +1,24 @@
+import shutil
+import tempfile
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.queries import record_queries
+
+from .. import caching
 from ..models import Follow, Group, Post
+from ..paginators import encode_cursor
 
 User = get_user_model()
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -30,6 +39,13 @@ class PostPagesTests(TestCase):
         cls.unsubscribed_user = User.objects.create_user(
             username='Отписавшийся пользователь'
         )
+        # Больше одной страницы: в кешированный фрагмент попадает
+        # и навигация с курсором следующей страницы.
+        cls.other_author = User.objects.create_user(username='Другой автор')
+        for i in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(
+                text=f'Запись другого автора {i}', author=cls.other_author
+            )
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x01\x00'
             b'\x01\x00\x00\x00\x00\x21\xf9\x04'
@@ -49,7 +65,13 @@ class PostPagesTests(TestCase):
             image=uploaded,
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='HasNoName')
         self.authorized_client = Client()
@@ -110,22 +132,111 @@ class PostPagesTests(TestCase):
         post_object = response.context['post']
         self.checking_post_context(post_object)
 
+    def get_index(self):
+        """Главная страница и число запросов к базе.
+
+        При попадании в кеш фрагмента анонимный запрос главной не
+        обращается к базе: ни посты страницы, ни COUNT(*), ни курсоры
+        навигации не выбираются.
+        """
+        with record_queries() as log:
+            response = self.guest_client.get(reverse('posts:index'))
+        return response, len(log)
+
     def test_index_cache(self):
         """Проверка кеширования index"""
-        first_response = self.guest_client.get(reverse('posts:index'))
+        first_response, first_queries = self.get_index()
+        self.assertGreater(first_queries, 0)
+        self.assertTrue(first_response.context['page_obj'].has_next())
+        Post.objects.filter(pk=PostPagesTests.post.pk).update(
+            text='Изменено в обход сигналов'
+        )
+        cached_response, cached_queries = self.get_index()
+        self.assertEqual(cached_queries, 0)
+        self.assertEqual(first_response.content, cached_response.content)
+        self.assertContains(cached_response, '?after=')
+
         new_post = Post.objects.create(
             text='Тестовая запись',
             author=PostPagesTests.author,
         )
+        last_response, last_queries = self.get_index()
 
-        last_response = self.guest_client.get(reverse('posts:index'))
+        self.assertGreater(last_queries, 0)
+        self.assertIn(new_post, last_response.context['page_obj'])
+        self.assertContains(last_response, new_post.text)
 
-        self.assertEqual(first_response.content, last_response.content)
+    def test_index_cache_invalidated_by_generations(self):
+        """Правка и удаление поста, правка группы видны сразу"""
+        post = Post.objects.create(
+            text='Исходный текст',
+            author=PostPagesTests.author,
+            group=PostPagesTests.group,
+        )
+        self.get_index()
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertContains(self.get_index()[0], 'Исправленный текст')
 
-        cache.clear()
-        response = self.guest_client.get(reverse('posts:index'))
+        group = PostPagesTests.group
+        group.title = 'Переименованные котики'
+        group.save()
+        self.assertContains(self.get_index()[0], 'Переименованные котики')
+
+        post.delete()
+        self.assertNotContains(self.get_index()[0], 'Исправленный текст')
+
+    def test_index_cache_hit_rate(self):
+        """Без изменений страница почти всегда отдаётся из кеша"""
+        requests = 20
+        hits = 0
+        for i in range(requests):
+            if i == requests // 2:
+                Post.objects.create(
+                    text='Запись посередине',
+                    author=PostPagesTests.author,
+                )
+            hits += self.get_index()[1] == 0
+        self.assertEqual(hits, requests - 2)
+
+    def test_follow_cache_is_per_user(self):
+        """Ленты подписок разных пользователей не делят кеш"""
+        Follow.objects.create(author=PostPagesTests.author,
+                              user=PostPagesTests.subscribed_user)
+        subscribed = Client()
+        subscribed.force_login(PostPagesTests.subscribed_user)
+        unsubscribed = Client()
+        unsubscribed.force_login(PostPagesTests.unsubscribed_user)
 
-        self.assertIn(new_post, response.context['page_obj'])
+        self.assertContains(
+            subscribed.get(reverse('posts:follow_index')),
+            PostPagesTests.post.text
+        )
+        self.assertNotContains(
+            unsubscribed.get(reverse('posts:follow_index')),
+            PostPagesTests.post.text
+        )
+
+    def test_new_post_refreshes_cached_follow_feed(self):
+        """Новый пост сбрасывает кеш ленты подписчика через версию автора"""
+        subscribed_user = PostPagesTests.subscribed_user
+        Follow.objects.create(author=PostPagesTests.author,
+                              user=subscribed_user)
+        subscribed = Client()
+        subscribed.force_login(subscribed_user)
+        subscribed.get(reverse('posts:follow_index'))
+        key = caching.version_key(f'follow:{subscribed_user.pk}')
+        version = cache.get(key)
+
+        new_post = Post.objects.create(
+            text='Запись для подписчиков',
+            author=PostPagesTests.author,
+        )
+
+        self.assertEqual(cache.get(key), version)
+        self.assertContains(
+            subscribed.get(reverse('posts:follow_index')), new_post.text
+        )
 
     def test_followers_see_followed_author_post(self):
         """Новая запись пользователя появляется в ленте тех, кто на него
@@ -264,3 +375,68 @@ class PaginatorViewsTest(TestCase):
                         reverses + '?page=2').context.get('page_obj')),
                     second_page
                 )
+
+    def test_keyset_pages(self):
+        """Курсоры ?after= и ?before= листают ленту без номеров страниц"""
+        urls = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_posts',
+                kwargs={'slug': PaginatorViewsTest.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PaginatorViewsTest.author.username})
+        ]
+        for reverses in urls:
+            with self.subTest(reverses=reverses):
+                first_page = self.client.get(reverses).context['page_obj']
+                second_page = self.client.get(
+                    reverses + '?after=' + first_page.next_cursor()
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 5)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(
+                    set(first_page).isdisjoint(second_page.object_list))
+                back_page = self.client.get(
+                    reverses + '?before=' + second_page.previous_cursor()
+                ).context['page_obj']
+                self.assertEqual(
+                    list(back_page.object_list),
+                    list(first_page.object_list)
+                )
+                self.assertFalse(back_page.has_previous())
+
+    def test_first_page_skips_count(self):
+        """Первая страница без ?page= выбирается без COUNT(*)"""
+        cache.clear()
+        with record_queries() as log:
+            response = self.client.get(reverse('posts:index'))
+        post_queries = [
+            sql for sql in log.queries if 'FROM "posts_post"' in sql
+        ]
+        self.assertEqual(len(post_queries), 1)
+        self.assertNotIn('COUNT(', post_queries[0])
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.has_next())
+        self.assertContains(
+            response, '?after=' + page_obj.next_cursor()
+        )
+        self.assertNotContains(response, '?page=2')
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?after=broken')
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_malformed_cursor_values_fall_back_to_first_page(self):
+        """Курсор с нечисловым id или датой без пояса не ломает ленту"""
+        cursors = {
+            'id': encode_cursor('2021-01-01T00:00:00+00:00', '²'),
+            'naive date': encode_cursor('2021-01-01T00:00:00', 1),
+        }
+        for name, cursor in cursors.items():
+            with self.subTest(cursor=name):
+                response = self.client.get(
+                    reverse('posts:index'), {'after': cursor}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page_obj'].number, 1)
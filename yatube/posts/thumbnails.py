@@ -0,0 +1,210 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import page_cache
+
+from . import caching, variants
+from .models import Post
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, умеющий искать миниатюру без генерации."""
+
+    def thumbnail_options(self, source, options):
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры, которую создал бы get_thumbnail, без чтения."""
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.thumbnail_options(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из KVStore или None, если её ещё нет."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, options)
+        )
+
+
+backend = PregeneratedThumbnailBackend()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def pending_key(name):
+    return f'thumbnails:pending:{name}'
+
+
+def get_thumbnail(image, geometry):
+    """Миниатюра размера geometry из THUMBNAIL_GEOMETRIES.
+
+    Пока картинка стоит в очереди, возвращает None, и шаблон показывает
+    заглушку. Картинки, которых нет в очереди (загруженные до фоновой
+    генерации), уменьшаются сразу, как в теге {% thumbnail %}.
+    """
+    if not image:
+        return None
+    geometry_string, options = settings.THUMBNAIL_GEOMETRIES[geometry]
+    thumbnail = backend.get_cached_thumbnail(
+        image, geometry_string, **options
+    )
+    if thumbnail is not None:
+        return thumbnail
+    if cache.get(pending_key(image.name)):
+        return None
+    return backend.get_thumbnail(image, geometry_string, **options)
+
+
+def _get_many_cached(thumbnail_files):
+    """Читает записи KVStore пачкой.
+
+    Один get_many к кешу и один запрос к таблице для промахов, как делает
+    cached_db KVStore из sorl-thumbnail для отдельной записи.
+    """
+    kvstore = default.kvstore
+    keys = {add_prefix(thumbnail.key): thumbnail
+            for thumbnail in thumbnail_files}
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore.get(thumbnail)
+                for key, thumbnail in keys.items()}
+    empty = cached_db_kvstore.EMPTY_VALUE
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value')
+        )
+        fetched = {key: found.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return {
+        key: None if value == empty else deserialize_image_file(value)
+        for key, value in values.items()
+    }
+
+
+def prefetch_thumbnails(posts, geometry='card'):
+    """Находит миниатюры всех постов страницы разом.
+
+    Результат кладётся в post.thumbnails[geometry]; тег post_thumbnail
+    берёт его оттуда вместо отдельного запроса к KVStore на каждый пост.
+    """
+    geometry_string, options = settings.THUMBNAIL_GEOMETRIES[geometry]
+    # Постам с вариантами для srcset миниатюры sorl не нужны.
+    files = {
+        post: backend.thumbnail_file(post.image, geometry_string, options)
+        for post in posts if post.image and not post.image_variants
+    }
+    cached = _get_many_cached(files.values())
+    for post in posts:
+        if not hasattr(post, 'thumbnails'):
+            post.thumbnails = {}
+        if post not in files:
+            post.thumbnails[geometry] = None
+            continue
+        thumbnail = cached[add_prefix(files[post].key)]
+        if thumbnail is None:
+            thumbnail = get_thumbnail(post.image, geometry)
+        post.thumbnails[geometry] = thumbnail
+
+
+def generate(name):
+    """Создаёт миниатюры sorl-thumbnail во всех размерах из настроек."""
+    # Хранилище картинки входит в ключ KVStore: берём то же, что у поля.
+    source = ImageFile(name, post_image_storage)
+    for geometry_string, options in settings.THUMBNAIL_GEOMETRIES.values():
+        backend.get_thumbnail(source, geometry_string, **options)
+
+
+def _generate_job(name):
+    try:
+        generate(name)
+        metadata = variants.dump(
+            variants.build_variants(name, post_image_storage)
+        )
+        posts = list(Post.objects.filter(image=name))
+        Post.objects.filter(image=name).update(
+            image_variants=metadata, updated=timezone.now()
+        )
+        # Ленты и страницы с заглушкой вместо картинки закешированы.
+        for post in posts:
+            caching.bump_post_feeds(post)
+            page_cache.purge_paths(caching.post_pages(post))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        cache.delete(pending_key(name))
+
+
+def _worker_job(name):
+    try:
+        _generate_job(name)
+    finally:
+        close_old_connections()
+
+
+def submit(name):
+    """Ставит картинку в очередь, если её там ещё нет.
+
+    Отметка об очереди живёт THUMBNAIL_PENDING_TIMEOUT секунд: если
+    поток не справился, шаблоны вернутся к генерации в запросе.
+    """
+    if not cache.add(
+        pending_key(name), True, settings.THUMBNAIL_PENDING_TIMEOUT
+    ):
+        return
+    if settings.THUMBNAIL_WORKERS:
+        get_executor().submit(_worker_job, name)
+    else:
+        _generate_job(name)
+
+
+def queue_post(post):
+    """Ставит миниатюры поста в очередь после коммита транзакции."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: submit(name))
@@ -0,0 +1,226 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, TimelineEntry
+from .paginators import POST_ORDER_FIELDS
+
+PULLED_AUTHORS_KEY = 'timeline:pulled_authors'
+
+
+def pulled_author_ids():
+    """Авторы, чьи посты не раскладываются по лентам подписчиков.
+
+    У таких авторов больше FEED_FANOUT_MAX_FOLLOWERS подписчиков, их
+    посты подмешиваются в ленту при чтении.
+    """
+    author_ids = cache.get(PULLED_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+            .values_list('author', flat=True)
+        )
+        cache.set(
+            PULLED_AUTHORS_KEY, author_ids, settings.FEED_PULLED_AUTHORS_TTL
+        )
+    return author_ids
+
+
+def batched_rows(queryset, *fields, batch_size=None):
+    """Перебирает строки (id, *fields) пачками по возрастанию id.
+
+    Каждая пачка выбирается отдельным запросом, курсор не остаётся
+    открытым на время записи.
+    """
+    batch_size = batch_size or settings.FEED_BATCH_SIZE
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', *fields)[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def batched_values(queryset, field='pk', batch_size=None):
+    """batched_rows для одного поля: пачки значений, а не кортежей."""
+    for rows in batched_rows(queryset, field, batch_size=batch_size):
+        yield [value for _, value in rows]
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if post.author_id in pulled_author_ids():
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    for user_ids in batched_values(followers, 'user_id'):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post.pk,
+                    pub_date=post.pub_date
+                )
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True
+        )
+
+
+def fan_out_posts(posts):
+    """fan_out_post для пачки постов (id, author_id, pub_date)."""
+    pulled = pulled_author_ids()
+    post_dates = defaultdict(list)
+    for post_id, author_id, pub_date in posts:
+        if author_id not in pulled:
+            post_dates[author_id].append((post_id, pub_date))
+    for author_id, dates in post_dates.items():
+        followers = Follow.objects.filter(author_id=author_id)
+        for user_ids in batched_values(followers, 'user_id'):
+            TimelineEntry.objects.bulk_create(
+                [
+                    TimelineEntry(
+                        user_id=user_id,
+                        post_id=post_id,
+                        pub_date=pub_date
+                    )
+                    for user_id in user_ids
+                    for post_id, pub_date in dates
+                ],
+                ignore_conflicts=True
+            )
+
+
+def fan_out_post_range(first_id, last_id):
+    """fan_out_posts для всех постов с id от first_id до last_id.
+
+    Записи создаются одним INSERT ... SELECT в базе: для массовой
+    загрузки это на порядок быстрее, чем строить объекты в Python.
+    Посты в промежутке должны быть новыми, иначе запись повторится.
+    """
+    pulled = sorted(pulled_author_ids())
+    exclude = ''
+    if pulled:
+        exclude = f'AND p.author_id NOT IN ({", ".join(["%s"] * len(pulled))})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {Post._meta.db_table} p '
+            f'JOIN {Follow._meta.db_table} f ON f.author_id = p.author_id '
+            f'WHERE p.id >= %s AND p.id <= %s {exclude}',
+            [first_id, last_id, *pulled]
+        )
+        return cursor.rowcount
+
+
+def fan_out_author(author_id):
+    """Раскладывает все посты автора по лентам его подписчиков.
+
+    Уже разложенные посты пропускаются, поэтому вызов можно повторять.
+    """
+    entries = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {Post._meta.db_table} p '
+            f'JOIN {Follow._meta.db_table} f ON f.author_id = p.author_id '
+            f'WHERE p.author_id = %s AND NOT EXISTS ('
+            f'SELECT 1 FROM {entries} t '
+            f'WHERE t.user_id = f.user_id AND t.post_id = p.id)',
+            [author_id]
+        )
+        return cursor.rowcount
+
+
+def follower_removed(author_id):
+    """Раскладывает посты автора, который перестал быть популярным.
+
+    Пока автора подмешивали при чтении, его посты не попадали в
+    TimelineEntry и без этого пропали бы из лент. Кеш популярных
+    сбрасывается до раскладки: посты, созданные между ними, разложит
+    fan_out_post. При локальном кеше другие процессы видят старый
+    список до FEED_PULLED_AUTHORS_TTL - посты за это время дозаполнит
+    повторный fan_out_author (например, rebuild_timelines).
+    """
+    if author_id not in pulled_author_ids():
+        return
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if followers > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    cache.delete(PULLED_AUTHORS_KEY)
+    fan_out_author(author_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    if author_id in pulled_author_ids():
+        return
+    posts = Post.objects.filter(author_id=author_id)
+    for rows in batched_rows(posts, 'pub_date'):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    pub_date=pub_date
+                )
+                for post_id, pub_date in rows
+            ],
+            ignore_conflicts=True
+        )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_ids):
+    """Пересобирает ленты указанных пользователей с нуля."""
+    for user_id in user_ids:
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        author_ids = Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True)
+        for author_id in author_ids:
+            backfill(user_id, author_id)
+
+
+def timeline_posts(user):
+    """Лента подписок из материализованной таблицы TimelineEntry.
+
+    Возвращает посты и поля даты и id для сортировки. Без популярных
+    авторов лента сортируется по копиям в TimelineEntry и читается
+    диапазоном индекса timeline_user_pub_date.
+    """
+    pulled = pulled_author_ids()
+    if not pulled:
+        posts = Post.objects.filter(timeline_entries__user=user).annotate(
+            entry_pub_date=F('timeline_entries__pub_date'),
+            entry_post_id=F('timeline_entries__post_id')
+        )
+        return posts, ('entry_pub_date', 'entry_post_id')
+    pulled = Follow.objects.filter(
+        user=user,
+        author_id__in=pulled
+    ).values_list('author_id', flat=True)
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    return (
+        Post.objects.filter(
+            Q(pk__in=entries) | Q(author_id__in=list(pulled))
+        ),
+        POST_ORDER_FIELDS
+    )
@@ -0,0 +1,149 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+from .variants import EXTENSIONS
+
+# Сколько байт начала файла держать в памяти, пока ищем размеры в заголовке.
+HEADER_LIMIT = 256 * 1024
+
+# Форматы, которые пересохраняются без метаданных, и формат записи.
+# MPO (снимки камер и телефонов) Pillow не пишет, сохраняем первый кадр
+# как JPEG. GIF не трогаем, чтобы не потерять анимацию.
+REENCODED_FORMATS = {
+    'JPEG': 'JPEG',
+    'MPO': 'JPEG',
+    'PNG': 'PNG',
+    'WEBP': 'WEBP',
+}
+
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+ORIENTATION_TAG = 0x0112
+
+ORIENTATIONS = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+def size_error():
+    return (
+        'Файл слишком большой: не больше '
+        f'{filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)}.'
+    )
+
+
+def pixels_error():
+    megapixels = settings.IMAGE_UPLOAD_MAX_PIXELS / 1_000_000
+    return f'Картинка слишком большая: не больше {megapixels:g} Мп.'
+
+
+def too_many_pixels(size):
+    width, height = size
+    return width * height > settings.IMAGE_UPLOAD_MAX_PIXELS
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузки во временный файл, не держа их в памяти.
+
+    По ходу загрузки проверяет объём и размеры картинки из заголовка.
+    Если лимит превышен, остаток файла не сохраняется, а у загрузки
+    появляется upload_error, который показывает PostForm.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.upload_error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload_error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.upload_error = size_error()
+            return None
+        if self.header is not None:
+            self.check_header(raw_data)
+            if self.upload_error:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        try:
+            image = Image.open(io.BytesIO(self.header))
+        except Exception:
+            # Заголовок ещё не дочитан или это не картинка: решит форма.
+            if len(self.header) >= HEADER_LIMIT:
+                self.header = None
+            return
+        self.header = None
+        if too_many_pixels(image.size):
+            self.upload_error = pixels_error()
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.upload_error = self.upload_error
+        return file
+
+
+def _has_metadata(image):
+    # Не image.text: у PNG он декодирует всю картинку ради текста в конце.
+    return any(key in image.info for key in METADATA_KEYS)
+
+
+def normalize_image(upload):
+    """Уменьшает слишком большие картинки и убирает из них метаданные.
+
+    JPEG декодируется сразу в уменьшенном виде (draft), остальное
+    уменьшается reduce и только потом LANCZOS: в памяти не бывает больше
+    одной полноразмерной копии кадра. Поворот из EXIF применяется к уже
+    уменьшенной картинке. MPO всегда пересохраняется в JPEG из первого
+    кадра. Если менять нечего, возвращает upload как есть.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    source_format = image.format
+    image_format = REENCODED_FORMATS.get(source_format)
+    max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+    oversized = max(image.size) > max_side
+    orientation = image.getexif().get(ORIENTATION_TAG, 1)
+    if image_format is None or not (
+        oversized or orientation in ORIENTATIONS or _has_metadata(image)
+        or image_format != source_format
+    ):
+        upload.seek(0)
+        return upload
+    icc_profile = image.info.get('icc_profile')
+    if oversized:
+        image.thumbnail(
+            (max_side, max_side), Image.LANCZOS, reducing_gap=2.0
+        )
+    if orientation in ORIENTATIONS:
+        image = image.transpose(ORIENTATIONS[orientation])
+    name = upload.name
+    if image_format != source_format:
+        name = f'{os.path.splitext(name)[0]}.{EXTENSIONS[image_format]}'
+    result = TemporaryUploadedFile(
+        name, Image.MIME[image_format], 0, None
+    )
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = settings.IMAGE_UPLOAD_QUALITY
+    image.save(result.file, image_format, **options)
+    result.size = result.file.tell()
+    result.seek(0)
+    return result
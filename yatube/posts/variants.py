@@ -0,0 +1,122 @@
+import io
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+def variant_formats(original_format):
+    """Форматы вариантов: WebP, если Pillow его умеет, и формат оригинала.
+
+    Форматы без поддержки записи (например, MPO) сохраняются как JPEG.
+    """
+    fallback = original_format if original_format in MIME_TYPES else 'JPEG'
+    formats = []
+    if features.check('webp') and fallback != 'WEBP':
+        formats.append('WEBP')
+    formats.append(fallback)
+    return formats
+
+
+def variant_name(name, width, image_format):
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{EXTENSIONS[image_format]}'
+
+
+def variant_widths(original_width):
+    """Ширины из IMAGE_VARIANT_WIDTHS, которые не больше оригинала.
+
+    Картинка уже самой узкой ширины получает один вариант своей ширины.
+    """
+    widths = [
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width <= original_width
+    ]
+    return widths or [original_width]
+
+
+def _save(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image_format == 'GIF':
+        image.save(buffer, image_format)
+    else:
+        image.save(
+            buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY
+        )
+    return buffer.getvalue()
+
+
+def build_variants(name, storage):
+    """Создаёт рядом с оригиналом варианты всех ширин и форматов.
+
+    storage - хранилище Post.image: из него же варианты отдаются и
+    удаляются вместе с оригиналом.
+
+    Все варианты обрезаны по центру до пропорций IMAGE_VARIANT_RATIO,
+    чтобы браузер мог взять любой из srcset. Возвращает метаданные для
+    Post.image_variants: сайт отдаёт srcset, не обращаясь к диску.
+    """
+    ratio_width, ratio_height = settings.IMAGE_VARIANT_RATIO
+    with storage.open(name) as file:
+        original = Image.open(file)
+        original_format = original.format
+        original.load()
+    if original.mode not in ('RGB', 'RGBA', 'L'):
+        original = original.convert('RGBA')
+    widths = variant_widths(original.width)
+    sources = {}
+    for image_format in variant_formats(original_format):
+        candidates = []
+        for width in widths:
+            height = max(1, round(width * ratio_height / ratio_width))
+            resized = ImageOps.fit(
+                original, (width, height), Image.LANCZOS
+            )
+            target = variant_name(name, width, image_format)
+            if storage.exists(target):
+                storage.delete(target)
+            target = storage.save_derived(
+                target, ContentFile(_save(resized, image_format))
+            )
+            candidates.append([target, width])
+        sources[MIME_TYPES[image_format]] = candidates
+    return {
+        'width': widths[-1],
+        'height': max(1, round(widths[-1] * ratio_height / ratio_width)),
+        'sources': sources,
+    }
+
+
+def dump(metadata):
+    return json.dumps(metadata, separators=(',', ':'))
+
+
+def load(value):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.warning('Повреждены метаданные вариантов картинки: %r', value)
+        return None
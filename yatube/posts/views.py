@@ -1,69 +1,136 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from core.page_cache import cache_anonymous
+from core.queries import query_budget
+from core.routers import replica_reads
+from core.sqlite import retry_on_lock
+
+from . import etags, exports, thumbnails
+from .caching import feed_cache_context, follow_scopes
+from .comments import comments_page
+from .counters import user_counters
+from .feeds import follow_feed_page
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post
+from .paginators import KeysetPage, get_page_obj, parse_comment_cursor
+from .search import (icontains_page, is_available, parse_search_cursor,
+                     search_page)
 
 
+@query_budget(4)
+@cache_anonymous
+@replica_reads
+@condition(etag_func=etags.index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list)
 
     context = {
         'page_obj': page_obj,
+        **feed_cache_context(request, ['index']),
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(6)
+@cache_anonymous
+@replica_reads
+@condition(etag_func=etags.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = get_page_obj(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(request, [f'group:{group.pk}']),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(7)
+@cache_anonymous
+@replica_reads
+@condition(etag_func=etags.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author
     ).exists()
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    counters = user_counters(author)
+    posts = author.posts.select_related('author', 'group')
+    page_obj = get_page_obj(request, posts)
     context = {
         'author': author,
+        'counters': counters,
         'page_obj': page_obj,
-        'paginator': paginator,
         'following': following,
+        **feed_cache_context(request, [f'author:{author.pk}']),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+@cache_anonymous
+@replica_reads
+@condition(etag_func=etags.post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        id=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    after = parse_comment_cursor(request.GET.get('comments_after', ''))
+    comments = comments_page(post.pk, after)
     context = {
         'post': post,
+        'author_counters': user_counters(post.author),
         'comments': comments,
         'form': form
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для «Показать ещё»."""
+    post = get_object_or_404(Post, pk=post_id)
+    after = parse_comment_cursor(request.GET.get('after', ''))
+    context = {
+        'post_id': post.pk,
+        'comments': comments_page(post.pk, after),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    after = parse_search_cursor(request.GET.get('after', ''))
+    if is_available():
+        page_obj = search_page(query, after=after)
+    else:
+        page_obj = KeysetPage(icontains_page(query), False, False)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@retry_on_lock
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -72,11 +139,14 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.queue_post(post)
         return redirect('posts:profile', username=request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if request.user != post.author:
@@ -87,6 +157,8 @@ def post_edit(request, post_id):
         instance=post)
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.queue_post(post)
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -96,6 +168,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -107,19 +181,54 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(6)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return render(request, 'posts/follow.html', {
+    page_obj = follow_feed_page(request)
+    context = {
         'page_obj': page_obj,
-        'paginator': paginator}
+        **feed_cache_context(request, follow_scopes(request.user)),
+    }
+    return render(request, 'posts/follow.html', context)
+
+
+def export_response(rows, request, filename):
+    data_format = request.GET.get('format')
+    if data_format not in exports.CONTENT_TYPES:
+        data_format = 'jsonl'
+    response = StreamingHttpResponse(
+        exports.stream(rows, data_format),
+        content_type=exports.CONTENT_TYPES[data_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{data_format}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(
+        exports.export_rows(author=author), request, f'yatube-{author.pk}'
+    )
+
+
+@login_required
+def group_export(request, slug):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(
+        exports.export_rows(group=group), request, f'yatube-{group.slug}'
     )
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     check_object = Follow.objects.filter(
@@ -134,6 +243,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     check_object = Follow.objects.filter(
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routers.PrimaryPinMiddleware',
 ]
 
 INTERNAL_IPS = [
@@ -76,9 +80,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Настройки каждого соединения SQLite (core.sqlite). WAL и NORMAL
+# безопасны вместе: при сбое питания теряются только последние
+# транзакции, база не портится.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Повторы транзакции записи при «database is locked».
+SQLITE_WRITE_RETRIES = 5
+
+SQLITE_RETRY_BASE_DELAY = 0.05
+
+# Реплика для чтения лент. Локально это второй файл SQLite, который
+# обновляет команда replicate_sqlite.
+if os.environ.get('YATUBE_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Сколько секунд после записи читатель читает из основной базы.
+REPLICA_PIN_SECONDS = 10
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -123,8 +162,136 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Версии лент и страниц живут в кеше, поэтому долгие сроки кеша
+# допустимы только с общим для всех процессов кешем: memcached по адресу
+# из YATUBE_MEMCACHED. У LocMemCache свой кеш в каждом процессе, и сдвиг
+# версии в одном процессе не виден другим, поэтому всё живёт недолго.
+SHARED_CACHE = bool(os.environ.get('YATUBE_MEMCACHED'))
+
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['YATUBE_MEMCACHED'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+            },
+        }
     }
+
+# Сколько живут записи, которые сбрасываются версиями, без общего кеша.
+LOCAL_CACHE_TTL = 60
+
+# Версии не истекают в общем кеше; в LocMemCache истёкшая версия
+# создаётся заново и сбрасывает всё, что закешировано с ней.
+CACHE_VERSION_TTL = None if SHARED_CACHE else LOCAL_CACHE_TTL
+
+POSTS_PER_PAGE = 10
+
+# Движок ленты подписок: 'join', 'timeline' или 'merge'.
+FOLLOW_FEED_ENGINE = 'timeline'
+
+# Посты авторов с большим числом подписчиков не раскладываются
+# по лентам, а подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+FEED_PULLED_AUTHORS_TTL = 600 if SHARED_CACHE else LOCAL_CACHE_TTL
+
+FEED_BATCH_SIZE = 1000
+
+# Сколько последних постов автора держать в кеше для движка 'merge'.
+FEED_AUTHOR_CACHE_SIZE = 200
+
+FEED_AUTHOR_CACHE_TTL = 60 * 60 * 24 if SHARED_CACHE else LOCAL_CACHE_TTL
+
+# Журнал SQL-запросов по view: превышения query_budget и N+1.
+QUERY_INSPECTOR_ENABLED = DEBUG
+
+QUERY_INSPECTOR_REPEAT_THRESHOLD = 3
+
+# Страницы целиком для анонимных читателей. Сбрасываются по путям
+# сигналами постов, комментариев и групп, поэтому с общим кешем живут
+# долго. Включается на сайте переменной окружения YATUBE_PAGE_CACHE=1,
+# отдельно от DEBUG.
+PAGE_CACHE_ENABLED = os.environ.get('YATUBE_PAGE_CACHE') == '1'
+
+PAGE_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else LOCAL_CACHE_TTL
+
+# С этими cookie (кроме cookie сессии) страница не берётся из кеша.
+PAGE_CACHE_BYPASS_COOKIES = ['messages', 'primary_pin']
+
+# Раз в столько обращений доля попаданий пишется в лог core.page_cache.
+PAGE_CACHE_REPORT_EVERY = 1000
+
+# Фрагменты лент сбрасываются версиями при изменениях, поэтому с общим
+# кешем живут долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else LOCAL_CACHE_TTL
+
+# Карточка поста в лентах; ключ меняется с Post.updated, поэтому
+# карточка живёт долго.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько слов вокруг совпадения показывать в результатах поиска.
+SEARCH_SNIPPET_TOKENS = 16
+
+# Размеры миниатюр, которые используют шаблоны: имя -> (геометрия, опции).
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
+
+# Потоки для фоновой генерации миниатюр: загрузка не ждёт ресайза.
+# 0 - создавать сразу после коммита в том же запросе; так работают
+# тесты (manage.py test, pytest), чтобы потоки не писали файлы
+# параллельно с удалением временного MEDIA_ROOT.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+THUMBNAIL_WORKERS = 0 if TESTING else int(
+    os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2)
+)
+
+THUMBNAIL_PENDING_TIMEOUT = 60 * 5
+
+# Варианты картинок поста для srcset: ширины, пропорции кадра и качество.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1440)
+
+IMAGE_VARIANT_RATIO = (960, 339)
+
+IMAGE_VARIANT_QUALITY = 80
+
+IMAGE_VARIANT_SIZES = '(min-width: 992px) 960px, 100vw'
+
+# Размытая заглушка, которая встраивается в страницу до загрузки картинки.
+IMAGE_PLACEHOLDER_SIZE = 16
+
+IMAGE_PLACEHOLDER_QUALITY = 40
+
+# Входит в ETag страниц: увеличить при изменении шаблонов, чтобы
+# браузеры не получали 304 на старую вёрстку.
+PAGE_ETAG_VERSION = 1
+
+# Комментарии под постом; первая страница кешируется до нового
+# комментария.
+COMMENTS_PER_PAGE = 20
+
+COMMENTS_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else LOCAL_CACHE_TTL
+
+# Строк на один запрос при выгрузке постов, комментариев и подписок.
+EXPORT_CHUNK_SIZE = 2000
+
+# Загрузки пишутся во временный файл и проверяются по ходу чтения.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.ImageUploadHandler']
+
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+# Больше пикселей не принимаем: распакованный кадр не поместится в память.
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
+# Длинная сторона оригинала после загрузки и качество пересохранения.
+IMAGE_UPLOAD_MAX_SIDE = 2560
+
+IMAGE_UPLOAD_QUALITY = 90